@@ -0,0 +1,295 @@
+## A compact on-disk store of board states for RandomStateGenerator.
+## Every state is stored as its bitboard pair (see bitboardKonane), each side packed little endian into
+## ceil(size * size / 8) bytes, so an 8x8 state takes 16 bytes. The file is a small header followed by
+## the fixed size records, and is memory mapped when opened, so opening a store costs the same no matter
+## how many states it holds and a state is only decoded into a list-of-lists board when it is asked for.
+##
+## The store acts like a read only list of boards (len, indexing, iteration, in), so random.choice works
+## on it directly and draws exactly the same states as it did from the pickled lists. Membership tests use
+## a set of the packed records, built the first time one is needed, so they take constant time. A
+## canonical store indexes each state by its symmetry canonical record instead, so a state counts as
+## already stored when any colour preserving symmetric copy of it is (see BoardSymmetry).
+##
+## Each store can also keep a metadata file next to it, with the number of legal moves and pieces of
+## both sides and the number of empty squares (how far into the game the state is) for every state.
+## It is computed the first time it is needed and only extended after that, and lets callers sample
+## states that pass a filter, like "at least 2 moves for the side to move", without searching anything.
+
+import array
+import binascii
+import mmap
+import os
+import struct
+import bitboardKonane
+import BoardSymmetry
+
+magic = "KBS1"
+headerFormat = "<4sI" # magic, board size
+headerSize = struct.calcsize(headerFormat)
+
+# The metadata kept for every state, in the order it is stored
+metadataFields = ("whiteMoves", "blackMoves", "whitePieces", "blackPieces", "emptySquares")
+WHITE_MOVES, BLACK_MOVES, WHITE_PIECES, BLACK_PIECES, EMPTY_SQUARES = range(len(metadataFields))
+
+def getMetadataFileName(fileName):
+    return os.path.splitext(fileName)[0] + ".meta"
+
+def getBytesPerSide(boardSize):
+    return (boardSize * boardSize + 7) / 8
+
+def encode(converter, board):
+    """
+    :param converter: bitboardKonane.Konane of the board's size
+    :param board: A list-of-lists board or a (blackBits, whiteBits) bitboard
+    :return: The board's record as a string of bytes
+    """
+    black, white = converter.toBitboard(board)
+    hexDigits = 2 * getBytesPerSide(converter.size)
+    return binascii.unhexlify("%0*x" % (hexDigits, black))[::-1] + \
+        binascii.unhexlify("%0*x" % (hexDigits, white))[::-1]
+
+def write(fileName, boardSize, states):
+    """
+    Writes a new store holding states to fileName, replacing any store there. The file is written
+    under a temporary name first, so an interrupted write never leaves a half written store behind.
+    :param states: List-of-lists boards or bitboards
+    """
+    converter = bitboardKonane.Konane(boardSize)
+    tempFileName = fileName + ".tmp"
+    stateFile = open(tempFileName, "wb")
+    stateFile.write(struct.pack(headerFormat, magic, boardSize))
+    for board in states:
+        stateFile.write(encode(converter, board))
+    stateFile.close()
+    if os.path.exists(fileName):
+        os.remove(fileName) # os.rename won't replace an existing file on Windows
+    if os.path.exists(getMetadataFileName(fileName)):
+        os.remove(getMetadataFileName(fileName)) # It describes the old states
+    os.rename(tempFileName, fileName)
+
+class BoardStateStore:
+    def __init__(self, fileName, boardSize, canonical = False):
+        """
+        Opens the store in fileName. A file that doesn't exist is an empty store until states are flushed to it.
+        :param boardSize: Size of the boards in the store, checked against the file's header.
+        :param canonical: Whether membership tests treat symmetric copies of a state as the same state
+        """
+        self.fileName = fileName
+        self.boardSize = boardSize
+        self.bytesPerSide = getBytesPerSide(boardSize)
+        self.recordSize = 2 * self.bytesPerSide
+        self.converter = bitboardKonane.Konane(boardSize)
+        self.symmetry = BoardSymmetry.BoardSymmetry(boardSize) if canonical else None
+        self.map = None
+        self.numStored = 0
+        self.pending = [] # Encoded records appended but not written yet
+        self.index = None # Set of every record in the store, see getIndex
+        self.metadata = None # Flat array of every state's metadataFields, see getMetadata
+        self.selections = {} # Indices of the states passing each filter, see select
+        self.open()
+
+    def open(self):
+        """
+        Memory maps the records in the file. A partly written record at the end is ignored.
+        """
+        self.close()
+        if not os.path.exists(self.fileName):
+            return
+        stateFile = open(self.fileName, "rb")
+        try:
+            fileMagic, size = struct.unpack(headerFormat, stateFile.read(headerSize))
+            if fileMagic != magic:
+                raise ValueError(self.fileName + " is not a board state store")
+            if size != self.boardSize:
+                raise ValueError(self.fileName + " holds " + str(size) + "x" + str(size) + " boards")
+            fileSize = os.fstat(stateFile.fileno()).st_size
+            self.numStored = (fileSize - headerSize) / self.recordSize
+            if self.numStored > 0:
+                self.map = mmap.mmap(stateFile.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            stateFile.close()
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.numStored = 0
+
+    def encode(self, board):
+        """
+        :return: The board's record as a string of recordSize bytes
+        """
+        return encode(self.converter, board)
+
+    def decodeBits(self, record):
+        """
+        :return: The (blackBits, whiteBits) bitboard stored in record
+        """
+        black = int(binascii.hexlify(record[self.bytesPerSide - 1::-1]), 16)
+        white = int(binascii.hexlify(record[:self.bytesPerSide - 1:-1]), 16)
+        return (black, white)
+
+    def getRecord(self, index):
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("board state index out of range")
+        if index >= self.numStored:
+            return self.pending[index - self.numStored]
+        start = headerSize + index * self.recordSize
+        return self.map[start:start + self.recordSize]
+
+    def getBits(self, index):
+        """
+        :return: The state at index as a (blackBits, whiteBits) bitboard
+        """
+        return self.decodeBits(self.getRecord(index))
+
+    def __len__(self):
+        return self.numStored + len(self.pending)
+
+    def __getitem__(self, index):
+        """
+        :return: The state at index as a list-of-lists board
+        """
+        return self.converter.toListBoard(self.getBits(index))
+
+    def __iter__(self):
+        for index in xrange(len(self)):
+            yield self[index]
+
+    def records(self):
+        """
+        Iterates over the records of every state in the store, in order.
+        """
+        for index in xrange(len(self)):
+            yield self.getRecord(index)
+
+    def getIndex(self):
+        """
+        :return: The set of records in the store, built from the file the first time it is asked for
+            and kept up to date by append after that.
+        """
+        if self.index is None:
+            self.index = set(self.indexKey(record) for record in self.records())
+        return self.index
+
+    def indexKey(self, record):
+        """
+        :return: The key record is kept under in the index, its canonical record for canonical stores
+        """
+        if self.symmetry is None:
+            return record
+        # The stores are per side to move, so only the colour preserving symmetries apply
+        return self.encode(self.symmetry.canonical(self.decodeBits(record), "B")[0])
+
+    def containsRecord(self, record):
+        return self.indexKey(record) in self.getIndex()
+
+    def __contains__(self, board):
+        return self.containsRecord(self.encode(board))
+
+    def append(self, board):
+        """
+        Adds a state to the end of the store. It is only written to the file on flush.
+        """
+        self.appendRecord(self.encode(board))
+
+    def appendRecord(self, record):
+        """
+        Adds an already encoded state to the end of the store.
+        """
+        self.pending.append(record)
+        if self.index is not None:
+            self.index.add(self.indexKey(record))
+        if self.metadata is not None:
+            self.metadata.extend(self.computeMetadata(self.decodeBits(record)))
+        self.selections = {}
+
+    def countDuplicates(self):
+        """
+        :return: The number of states in the store that are the same as an earlier state.
+        """
+        return len(self) - len(self.getIndex())
+
+    def flush(self):
+        """
+        Writes the appended states after the last whole record in the file and maps them.
+        """
+        if len(self.pending) == 0:
+            return
+        end = headerSize + self.numStored * self.recordSize
+        self.close()
+        if not os.path.exists(self.fileName):
+            write(self.fileName, self.boardSize, [])
+        stateFile = open(self.fileName, "r+b")
+        stateFile.seek(end)
+        stateFile.write("".join(self.pending))
+        stateFile.truncate()
+        stateFile.close()
+        self.pending = []
+        self.open()
+        if self.metadata is not None:
+            self.saveMetadata()
+
+    def computeMetadata(self, bits):
+        """
+        :return: The metadataFields of the (blackBits, whiteBits) state
+        """
+        converter = self.converter
+        return (len(converter.generateMoves(bits, "W")), len(converter.generateMoves(bits, "B")),
+                converter.countSymbol(bits, "W"), converter.countSymbol(bits, "B"), converter.countSymbol(bits, "."))
+
+    def loadMetadata(self):
+        """
+        Reads the metadata file and computes the metadata of any states it doesn't cover yet.
+        """
+        numFields = len(metadataFields)
+        self.metadata = array.array("H")
+        metadataFileName = getMetadataFileName(self.fileName)
+        if os.path.exists(metadataFileName):
+            metadataFile = open(metadataFileName, "rb")
+            numRows = min(os.fstat(metadataFile.fileno()).st_size / (numFields * self.metadata.itemsize), len(self))
+            self.metadata.fromfile(metadataFile, numRows * numFields)
+            metadataFile.close()
+        numKnown = len(self.metadata) / numFields
+        for index in xrange(numKnown, len(self)):
+            self.metadata.extend(self.computeMetadata(self.getBits(index)))
+        if numKnown < self.numStored:
+            self.saveMetadata()
+
+    def saveMetadata(self):
+        """
+        Writes the metadata of the states in the file to the metadata file.
+        """
+        metadataFile = open(getMetadataFileName(self.fileName), "wb")
+        self.metadata[:self.numStored * len(metadataFields)].tofile(metadataFile)
+        metadataFile.close()
+
+    def getMetadata(self, index):
+        """
+        :return: The tuple of metadataFields of the state at index
+        """
+        if self.metadata is None:
+            self.loadMetadata()
+        if index < 0:
+            index += len(self)
+        numFields = len(metadataFields)
+        return tuple(self.metadata[index * numFields:(index + 1) * numFields])
+
+    def select(self, predicate):
+        """
+        :param predicate: Function of a state's metadata, indexed like metadataFields, that is True for the states to keep
+        :return: An array of the indices of the states passing predicate. Kept until the store
+            changes, so pass the same function every time to only filter once.
+        """
+        selection = self.selections.get(predicate)
+        if selection is None:
+            if self.metadata is None:
+                self.loadMetadata()
+            numFields = len(metadataFields)
+            metadata = self.metadata
+            selection = array.array("L", [index for index in xrange(len(self))
+                                          if predicate(metadata[index * numFields:(index + 1) * numFields])])
+            self.selections[predicate] = selection
+        return selection
@@ -0,0 +1,130 @@
+## The symmetries of the Konane board, for sharing cached results between symmetric positions.
+## A square board has eight symmetries (rotations and reflections). On an even sized board four of them
+## move every piece onto a square of the other colour, so they only give an equivalent position when the
+## colours (and the side to move) are swapped as well. The other four keep the colours and map a position
+## onto one with exactly the same moves, pieces and evaluation.
+##
+## canonical() picks one representative out of a position's symmetric copies, and the move functions
+## translate moves between a position and its representative. Boards are handled as bitboards (see
+## bitboardKonane); each symmetry is applied with one table lookup per row and side.
+
+import bitboardKonane
+
+class BoardSymmetry:
+    # Names of the symmetries, in the order they are numbered, identity first
+    names = ("identity", "rotate90", "rotate180", "rotate270", "flipRows", "flipColumns", "transpose", "antiTranspose")
+
+    def __init__(self, size):
+        self.size = size
+        self.converter = bitboardKonane.Konane(size)
+        n = size - 1
+        squareMaps = (lambda r, c: (r, c),
+                      lambda r, c: (c, n - r),
+                      lambda r, c: (n - r, n - c),
+                      lambda r, c: (n - c, r),
+                      lambda r, c: (n - r, c),
+                      lambda r, c: (r, n - c),
+                      lambda r, c: (c, r),
+                      lambda r, c: (n - c, n - r))
+        # squares[s][r][c] is where symmetry s moves (r, c)
+        self.squares = [[[squareMap(r, c) for c in xrange(size)] for r in xrange(size)] for squareMap in squareMaps]
+        # A symmetry swaps the colours if it moves a black square onto a white one
+        self.swapsColours = [sum(squares[0][0]) % 2 == 1 for squares in self.squares]
+        self.colourPreserving = [s for s in xrange(len(self.names)) if not self.swapsColours[s]]
+        self.inverses = []
+        for s in xrange(len(self.names)):
+            for t in xrange(len(self.names)):
+                if all(self.squares[t][self.squares[s][r][c][0]][self.squares[s][r][c][1]] == (r, c)
+                       for r in xrange(size) for c in xrange(size)):
+                    self.inverses.append(t)
+                    break
+        self.rowTables = [None] * len(self.names)
+
+    def getRowTables(self, symmetry):
+        """
+        :return: tables where tables[r][pattern] is the bits that the pieces of row r in pattern are moved to.
+            Built the first time a symmetry is used.
+        """
+        tables = self.rowTables[symmetry]
+        if tables is None:
+            n = self.size
+            tables = []
+            for r in xrange(n):
+                rowTable = [0] * (1 << n)
+                for pattern in xrange(1, 1 << n):
+                    low = pattern & -pattern
+                    toR, toC = self.squares[symmetry][r][low.bit_length() - 1]
+                    rowTable[pattern] = rowTable[pattern ^ low] | (1 << (toR * n + toC))
+                tables.append(rowTable)
+            self.rowTables[symmetry] = tables
+        return tables
+
+    def transformSide(self, bits, symmetry):
+        n = self.size
+        rowMask = (1 << n) - 1
+        result = 0
+        for rowTable in self.getRowTables(symmetry):
+            if bits & rowMask:
+                result |= rowTable[bits & rowMask]
+            bits >>= n
+        return result
+
+    def transformBits(self, board, symmetry):
+        """
+        :param board: A list-of-lists board or a (blackBits, whiteBits) bitboard
+        :return: The bitboard of board moved by symmetry, with the colours swapped if the symmetry swaps them
+        """
+        black, white = self.converter.toBitboard(board)
+        if self.swapsColours[symmetry]:
+            return (self.transformSide(white, symmetry), self.transformSide(black, symmetry))
+        return (self.transformSide(black, symmetry), self.transformSide(white, symmetry))
+
+    def transformPlayer(self, player, symmetry):
+        if self.swapsColours[symmetry]:
+            return 'W' if player == 'B' else 'B'
+        return player
+
+    def transformMove(self, move, symmetry):
+        """
+        :return: The move that move becomes on the board moved by symmetry
+        """
+        if len(move) == 0:
+            return move
+        r1, c1 = self.squares[symmetry][move[0]][move[1]]
+        r2, c2 = self.squares[symmetry][move[2]][move[3]]
+        return [r1, c1, r2, c2]
+
+    def canonical(self, board, player, swapColours = False):
+        """
+        Picks the representative of board's symmetric positions: the smallest (bitboard, player) of them.
+        Boards where the special opening moves apply are their own representative, since those rules
+        don't map onto each other for every symmetry.
+        :param swapColours: Whether to also use the symmetries that swap the colours and the side to move.
+        :return: (canonical bitboard, canonical player, symmetry that maps board onto it)
+        """
+        board = self.converter.toBitboard(board)
+        if self.converter.openingMove(board):
+            return (board, player, 0)
+        symmetries = self.colourPreserving
+        if swapColours:
+            symmetries = xrange(len(self.names))
+        best = None
+        for symmetry in symmetries:
+            candidate = (self.transformBits(board, symmetry), self.transformPlayer(player, symmetry), symmetry)
+            if best is None or candidate[:2] < best[:2]:
+                best = candidate
+        return best
+
+    def toCanonicalMove(self, move, symmetry):
+        """
+        :param symmetry: The symmetry canonical returned for the board
+        :return: The move on the canonical board that matches move on the original board
+        """
+        return self.transformMove(move, symmetry)
+
+    def fromCanonicalMove(self, move, symmetry):
+        """
+        :param symmetry: The symmetry canonical returned for the board
+        :return: The move on the original board that matches move on the canonical board
+        """
+        return self.transformMove(move, self.inverses[symmetry])
@@ -7,6 +7,9 @@ import updatedKonane
 import TestSuite
 import johnMinimaxEvolved
 import Pie
+import MultiModelSearch
+import ModelPopulation
+import ParallelEvaluator
 import random
 import gakonane
 import sys
@@ -15,6 +18,11 @@ from time import strftime
 from copy import copy
 from datetime import datetime
 
+try:
+    import numpy as np
+except ImportError:
+    np = None # updateModelDiversity falls back to plain Python
+
 #TODO:
 #   Still getting stuck, look closer into how the parents are doing.
 #   Divide each diversity by max of that round!
@@ -30,9 +38,20 @@ class EEA(updatedKonane.Konane):
         self.depthLimit = myDepth
 
         self.models = []
+        # Holds the models' weights in one array when NumPy is around, see initModels
+        self.population = None
         self.numModelParents = self.numModels / 2
         self.modelsPlayer = johnMinimaxEvolved.MinimaxPlayer(self.size, self.depthLimit)
         self.modelsPlayer.initialize("W")
+        # Searches each puzzle once for every model when NumPy is around
+        if MultiModelSearch.isAvailable():
+            self.batchSearcher = MultiModelSearch.MultiModelSearcher(self.size, self.depthLimit)
+        else:
+            self.batchSearcher = None
+        # (model weights, puzzle id, depth) -> the move that model makes for that puzzle
+        self.predictionCache = {}
+        # Set by startProcessPool to search models on worker processes
+        self.evaluator = None
 
         # self.opponent = updatedKonane.HumanPlayer(self.size)
         # self.opponent.initialize("W")
@@ -54,6 +73,11 @@ class EEA(updatedKonane.Konane):
 
     def initModels(self, numTimesToMutate = 5):
         """ Initializes the models that we'll evolve """
+        if ModelPopulation.isAvailable():
+            self.population = ModelPopulation.ModelPopulation(self.size, self.numModels)
+            self.population.mutate(numTimesToMutate)
+            self.models = self.population.models
+            return
         for i in range(self.numModels):
             currModel = StaticEvalModel.StaticEvalModel(self.size)
             for _ in range(numTimesToMutate):
@@ -131,13 +155,10 @@ class EEA(updatedKonane.Konane):
         for model in self.models:
             model.numCorrect = 0
             model.numTested = 0
-            for puzzle in test:
-                puzzleSide = puzzle.side
-                puzzleState = puzzle.state
-                puzzleResult = puzzle.result
-                self.modelsPlayer.model = model
-                self.modelsPlayer.setSide(puzzleSide)
-                modelMove = self.modelsPlayer.getMove(puzzleState)
+        testModelMoves = self.getModelMoves(self.models, test)
+        for puzzle, modelMoves in zip(test, testModelMoves):
+            puzzleResult = puzzle.result
+            for model, modelMove in zip(self.models, modelMoves):
                 model.numTested += 1
                 # print "model move " + str(modelMove)
                 # print "opponent move " + str(puzzleResult)
@@ -152,7 +173,74 @@ class EEA(updatedKonane.Konane):
 
                 if puzzleResult == modelMove:
                     model.numCorrect += 1
-            # print("Fitness of current model: " + str(model.getFitness()))
+
+        # Only models still in the population can be asked again, forget the rest
+        currentWeights = set([model.getWeightsKey() for model in self.models])
+        for key in self.predictionCache.keys():
+            if key[0] not in currentWeights:
+                del self.predictionCache[key]
+
+    def getModelMoves(self, models, test):
+        """
+        Gets the move each of the models makes for each puzzle in the test. Moves are remembered in
+        self.predictionCache, so models whose weights were already searched on a puzzle
+        (like the elite model kept each generation) are not searched again. Moves the test suite
+        already found while evolving the test (puzzle.modelResponses) are used as well.
+        :return: A list with a list of moves for each puzzle, where the ith move is the move of models[i]
+        """
+        cache = self.predictionCache
+        testKeys = []
+        toSearch = []
+        searchedKeys = set()
+        for puzzle in test:
+            keys = [(model.getWeightsKey(), puzzle.puzzleId, self.depthLimit) for model in models]
+            for key, model in zip(keys, models):
+                if key not in cache and (key[0], key[2]) in puzzle.modelResponses:
+                    cache[key] = puzzle.modelResponses[(key[0], key[2])]
+                if key not in cache and key not in searchedKeys:
+                    searchedKeys.add(key)
+                    toSearch.append((key, model, puzzle))
+            testKeys.append(keys)
+        if toSearch:
+            searchedMoves = self.searchModelMoves([(model, puzzle) for key, model, puzzle in toSearch])
+            for (key, model, puzzle), move in zip(toSearch, searchedMoves):
+                cache[key] = move
+        return [[cache[key] for key in keys] for keys in testKeys]
+
+    def searchModelMoves(self, pairs):
+        """
+        Searches each (model, puzzle) pair, on the worker processes if there is an evaluator,
+        else all of a puzzle's models in one batched search if NumPy is around, else one by one.
+        :return: A list where the ith move is the move for pairs[i]
+        """
+        if self.evaluator is not None:
+            return self.evaluator.getMoves([(model.getWeightsKey(), puzzle.state, puzzle.side, self.depthLimit)
+                                            for model, puzzle in pairs])
+        moves = [None] * len(pairs)
+        puzzleIndices = {}
+        for i in range(len(pairs)):
+            puzzleIndices.setdefault(pairs[i][1], []).append(i)
+        for puzzle, indices in puzzleIndices.items():
+            models = [pairs[i][0] for i in indices]
+            if self.batchSearcher is not None:
+                puzzleMoves = self.batchSearcher.getMoves(puzzle.state, puzzle.side, models)
+            else:
+                puzzleMoves = []
+                self.modelsPlayer.setSide(puzzle.side)
+                for model in models:
+                    self.modelsPlayer.model = model
+                    puzzleMoves.append(self.modelsPlayer.getMove(puzzle.state))
+            for i, move in zip(indices, puzzleMoves):
+                moves[i] = move
+        return moves
+
+    def startProcessPool(self, processes = None):
+        """
+        Makes model searches for both the EEA and its test suite run on a pool of worker processes.
+        :param processes: Number of worker processes, defaults to the number of cores.
+        """
+        self.evaluator = ParallelEvaluator.ParallelEvaluator(processes)
+        self.testSuite.evaluator = self.evaluator
 
     def updateModelDiversity(self):
         """
@@ -162,18 +250,18 @@ class EEA(updatedKonane.Konane):
         Used this link to help understand MSE:
         http://www.ehow.com/how_8464173_calculate-mse.html
         """
-        for model in self.models:
-            # List of values for each feature of the model
-            featureVector = self.getModelFeatureVector(model)
+        if np is not None:
+            return self.updateModelDiversityVectorized()
+        featureVectors = [self.getModelFeatureVector(model) for model in self.models]
+        for model, featureVector in zip(self.models, featureVectors):
             # List of mean square errors for this versus each other model
             MSE = []
 
             #Calculate the MSE for this versus each other model
-            for otherModel in self.models:
+            for otherModel, otherFeatureVector in zip(self.models, featureVectors):
                 if otherModel is model:
                     continue
                 differences = []
-                otherFeatureVector = self.getModelFeatureVector(otherModel)
                 for i in range(len(featureVector)):
                     differences.append(otherFeatureVector[i] - featureVector[i]) # Error
                     differences[i] = differences[i] ** 2 #Squared error
@@ -187,6 +275,27 @@ class EEA(updatedKonane.Konane):
 
         return self.models
 
+    def updateModelDiversityVectorized(self):
+        """
+        The same diversities as updateModelDiversity, computed with NumPy from the population's weight matrix.
+        The squared distances between all pairs of models come from the Gram matrix,
+        |a - b|^2 = |a|^2 + |b|^2 - 2 a.b, so the work is a single matrix product.
+        :return: The models with updated diversity variables.
+        """
+        if self.population is not None:
+            weights = self.population.weights
+        else:
+            weights = np.array([self.getModelFeatureVector(model) for model in self.models], dtype=np.float64)
+        numModels, numFeatures = weights.shape
+        squaredNorms = np.einsum("ij,ij->i", weights, weights)
+        squaredDistances = squaredNorms[:, np.newaxis] + squaredNorms[np.newaxis, :] - 2 * np.dot(weights, weights.T)
+        # Rounding can leave tiny negative distances, and a model's distance to itself is 0
+        np.maximum(squaredDistances, 0, out=squaredDistances)
+        np.fill_diagonal(squaredDistances, 0)
+        diversities = squaredDistances.sum(axis=1) / (numFeatures * (numModels - 1))
+        for model, diversity in zip(self.models, diversities):
+            model.diversity = float(diversity)
+        return self.models
 
     def getModelFeatureVector(self, model):
         """
@@ -233,6 +342,11 @@ class EEA(updatedKonane.Konane):
         # print("Fitness of generation is: " + str([model.getFitness() for model in fitnessSortedModels]))
 
         pie = Pie.Pie(fitnessSortedModels[0:self.numModelParents])
+        if self.population is not None:
+            # Cross over and mutate the whole generation at once
+            parents = [pie.getTwo() for i in range(len(self.models) - 1)]
+            self.models = self.population.breed(parents, fitnessSortedModels[0])
+            return self.models
         for i in range(len(self.models) - 1):
             in1, in2 = pie.getTwo()
             curr = in1.crossOver(in2)
@@ -309,10 +423,18 @@ class EEA(updatedKonane.Konane):
                 + ", " + str(model.getCorrectPercent()) + "\n")
 
 if __name__ == "__main__":
+    # Pass --processes to search the models on every core
+    args = [arg for arg in sys.argv[1:] if arg != "--processes"]
     try:
-        eea = EEA(modelDepth=int(sys.argv[1]), opponentDepth=int(sys.argv[2]))
+        eea = EEA(modelDepth=int(args[0]), opponentDepth=int(args[1]))
     except IndexError:
         eea = EEA()
-    eea.run()
+    if "--processes" in sys.argv:
+        eea.startProcessPool()
+    try:
+        eea.run()
+    finally:
+        if eea.evaluator is not None:
+            eea.evaluator.close()
     # import cProfile
     # cProfile.run('eea.run(120)', sort="ncalls")
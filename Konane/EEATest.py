@@ -9,6 +9,9 @@ import randomBoardStates
 from copy import copy
 
 class EEATest:
+    # Puzzles with fewer moves than this can't make the models disagree, so they are never drawn
+    minMoves = 2
+
     def __init__(self, moveGenerator, testSize = 10, size = 8):
         self.moveGenerator = moveGenerator
         self.puzzles = self.genRandomPuzzles(testSize)
@@ -30,7 +33,7 @@ class EEATest:
         puzzles = []
         for i in range(num):
             currSide = random.choice(["W", "B"])
-            currState = self.moveGenerator.getRandom(currSide)
+            currState = self.moveGenerator.getRandom(currSide, minMoves=self.minMoves)
             currPuzzle = KonanePuzzle.KonanePuzzle(currState, currSide)
             puzzles.append(currPuzzle)
         return puzzles
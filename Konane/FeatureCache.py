@@ -0,0 +1,46 @@
+## A size bounded least-recently-used cache for static evaluation features.
+## The raw features of a board (move, piece and movable piece counts for both sides) do not depend
+## on a model's weights, so one cache is shared by every StaticEvalModel and evaluating a leaf that
+## another model already saw only costs the weighted sum.
+
+from collections import OrderedDict
+
+class FeatureCache:
+    def __init__(self, maxSize = 100000):
+        """
+        :param maxSize: The most entries kept, the least recently used entry is dropped past this.
+        """
+        self.maxSize = maxSize
+        self.clear()
+
+    def clear(self):
+        """
+        Empties the cache and resets the counters.
+        """
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        :return: The features stored for key, or None. A found entry becomes the most recently used.
+        """
+        try:
+            features = self.entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self.entries[key] = features
+        self.hits += 1
+        return features
+
+    def put(self, key, features):
+        """
+        Stores features for key, dropping the least recently used entry if the cache is full.
+        """
+        self.entries[key] = features
+        if len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
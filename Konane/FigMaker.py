@@ -8,10 +8,59 @@ try:
     from pylab import *
     import matplotlib.lines as mlines
     import seaborn as sns
-    import numpy as np
 except:
     print "Unable to import things in FigMaker! Probably a pypy issue."
-import datetime, os, re, sys
+try:
+    import numpy as np
+except ImportError:
+    np = None # DataFile columns stay as plain arrays
+import array, bisect, datetime, os, re, sys
+
+# The columns of an EEA data file, in file order, as (DataFile attribute, type).
+# Columns are matched by position: the header lines of the data files repeat %theirMovesWeight
+# where theirPiecesWeight is, and older files don't have the last three columns at all.
+dataFileSchema = [("roundNum", int), ("fitness", float), ("myMovesWeight", float), ("theirMovesWeight", float),
+                  ("myPiecesWeight", float), ("theirPiecesWeight", float), ("myMovableWeight", float),
+                  ("theirMovableWeight", float), ("roundEndTime", str), ("generationNum", int),
+                  ("diversity", float), ("percentCorrect", float)]
+# array module type codes the numeric columns are collected in
+columnTypeCodes = {int: "l", float: "d"}
+
+def readColumns(fileName, schema = dataFileSchema, separator = ", "):
+    """
+    Reads a CSV data file into typed columns in one pass. The header line is skipped, and so are rows
+    that don't have exactly one field per schema column.
+    :param schema: List of (column name, type) in file order. Types are int, float or str.
+    :return: A dict from column name to the column: a NumPy array for int and float columns
+        (a plain array.array without NumPy), and a list for str columns.
+    """
+    columns = []
+    for name, columnType in schema:
+        if columnType in columnTypeCodes:
+            columns.append((array.array(columnTypeCodes[columnType]), columnType))
+        else:
+            columns.append(([], columnType))
+    numColumns = len(schema)
+    dataFile = open(fileName, "r")
+    dataFile.readline()
+    for line in dataFile:
+        fields = line.rstrip("\r\n").split(separator)
+        if len(fields) != numColumns:
+            continue
+        try:
+            for (column, columnType), field in zip(columns, fields):
+                column.append(columnType(field))
+        except ValueError:
+            print fields
+            sys.exit(0)
+    dataFile.close()
+
+    result = {}
+    for name, (column, columnType) in zip([name for name, columnType in schema], columns):
+        if np is not None and columnType in columnTypeCodes:
+            column = np.frombuffer(column, dtype=column.typecode) if len(column) else np.array([], dtype=columnType)
+        result[name] = column
+    return result
 
 #TODO:
 # Make it show a line where a new round starts on the generations graphs
@@ -177,19 +226,11 @@ class AttrFile:
 Encapsulates the data from one EEA data file.
 """
 class DataFile:
+    weightNames = ["myMovesWeight", "theirMovesWeight", "myPiecesWeight", "theirPiecesWeight",
+                   "myMovableWeight", "theirMovableWeight"]
+
     def __init__(self, fileName, attrFile, outputToFile = True):
-        self.roundNum = []
-        self.fitness = []
-        self.myMovesWeight = []
-        self.theirMovesWeight = []
-        self.myPiecesWeight = []
-        self.theirPiecesWeight = []
-        self.myMovableWeight = []
-        self.theirMovableWeight = []
-        self.roundEndTime = []
-        self.generationNum = []
-        self.diversity = []
-        self.percentCorrect = []
+        # Every column in dataFileSchema is an attribute, self.roundNum, self.fitness and so on
         self.attrs = attrFile
         self.fileName = fileName
         self.figFolder = "figures/fromInternet/"
@@ -202,16 +243,32 @@ class DataFile:
         """
         Gets the ith data as a tuple in the same format as in EEA data files.
         """
-        return (self.roundNum[i], self.fitness[i], self.myMovesWeight[i], self.theirMovesWeight[i], self.myPiecesWeight[i],
-                self.theirPiecesWeight[i], self.myMovableWeight[i], self.theirMovableWeight[i],
-                self.roundEndTime[i], self.generationNum[i], self.diversity[i])
+        return tuple([columnType(getattr(self, name)[i]) for name, columnType in dataFileSchema[:11]])
+
+    def getWeights(self, i):
+        """
+        Gets the weights of the ith model as a tuple in featuresNameList order, for StaticEvalModel.setWeights.
+        """
+        return tuple([float(getattr(self, name)[i]) for name in self.weightNames])
+
+    def indexOf(self, columnName, value):
+        """
+        Gets the index of the first row where the column has the given value.
+        """
+        column = getattr(self, columnName)
+        if np is not None and isinstance(column, np.ndarray):
+            matches = np.flatnonzero(column == value)
+            if len(matches) == 0:
+                raise ValueError(str(value) + " is not in " + columnName)
+            return int(matches[0])
+        return column.index(value)
 
     def getNMaxFitnessValues(self, N):
         """
         Gets the N max fitness values
         """
         #print sorted(self.fitness)[:-N:-1]
-        return sorted(self.fitness)[:-N-1:-1]
+        return sorted(self.fitness.tolist())[:-N-1:-1]
 
     def getNMaxFitnessLines(self, N):
         """
@@ -220,7 +277,7 @@ class DataFile:
         toRet = []
         bestFitness = self.getNMaxFitnessValues(N)
         for i in range(len(bestFitness)):
-            currIndex = self.fitness.index(bestFitness[i])
+            currIndex = self.indexOf("fitness", bestFitness[i])
             toRet.append(self.getDataNumber(currIndex))
 
         return toRet
@@ -235,38 +292,8 @@ class DataFile:
         """
         Pulls the data from all of the pop data files so we can work with it.
         """
-        regex = "(.*), (.*), (.*), (.*), (.*), (.*), (.*), (.*), (.*), (.*), (.*), (.*)"
-        dataFile = open(self.fileName, "r")
-        #dataFile.readline()
-        dataFile.readline()
-        for line in dataFile:
-            # print line
-            matched = re.match(regex, line)
-            if matched:
-                self.appendData(matched)
-
-        dataFile.close()
-
-    def appendData(self, match):
-        """
-        Appends the given regex match to the data of this.
-        """
-        try:
-            self.roundNum.append(int(match.group(1)))
-            self.fitness.append(float(match.group(2)))
-            self.myMovesWeight.append(float(match.group(3)))
-            self.theirMovesWeight.append(float(match.group(4)))
-            self.myPiecesWeight.append(float(match.group(5)))
-            self.theirPiecesWeight.append(float(match.group(6)))
-            self.myMovableWeight.append(float(match.group(7)))
-            self.theirMovableWeight.append(float(match.group(8)))
-            self.roundEndTime.append(match.group(9))
-            self.generationNum.append(int(match.group(10)))
-            self.diversity.append(float(match.group(11)))
-            self.percentCorrect.append(float(match.group(12)))
-        except:
-            print match.groups()
-            sys.exit(0)
+        for name, column in readColumns(self.fileName).items():
+            setattr(self, name, column)
 
     def getTimeTaken(self):
         """
@@ -316,33 +343,16 @@ class DataFile:
         xAxis is something like self.generationNum, self.roundNum
         fature is something like self.fitness
         """
-        averages = []
         absoluteMax = max(feature)
-        roundBreaks = self.getRoundBreaks()
+        starts = self.getGroupStarts(xAxis)
+        ends = starts[1:] + [len(xAxis)]
+        if np is not None and isinstance(feature, np.ndarray):
+            averages = (np.add.reduceat(feature, starts) / np.subtract(ends, starts)).tolist()
+        else:
+            averages = [float(sum(feature[start:end])) / (end - start) for start, end in zip(starts, ends)]
         breakPlots = []
-        tempAvg = 0.0
-        currGenNum = 1
-        counter = 0
-        for i in range(len(xAxis)):
-            tempAvg += float(feature[i])
-            counter += 1
-
-            if showRoundBreaks and i in roundBreaks:
-                breakPlots.append([currGenNum, currGenNum])
-                breakPlots.append([0, absoluteMax])
-
-            if i == len(xAxis)-1:
-                tempAvg = tempAvg / counter
-                averages.append(tempAvg)
-                currGenNum += 1
-                break
-
-            if xAxis[i] != xAxis[i+1]:
-                tempAvg = tempAvg / counter
-                averages.append(tempAvg)
-                tempAvg = 0
-                counter = 0
-                currGenNum += 1
+        if showRoundBreaks:
+            breakPlots = self.getBreakPlots(starts, absoluteMax)
 
         #print averages
 
@@ -379,18 +389,12 @@ class DataFile:
         xAxis is something like self.generationNum, self.roundNum
         fature is something like self.fitness
         """
-        maxes = []
-        tempMax = []
-        for i in range(len(xAxis)):
-            tempMax.append(float(feature[i]))
-            if i == len(xAxis)-1:
-                maxes.append(max(tempMax))
-                tempMax = []
-                break
-
-            if xAxis[i] != xAxis[i+1]:
-                maxes.append(max(tempMax))
-                tempMax = []
+        starts = self.getGroupStarts(xAxis)
+        if np is not None and isinstance(feature, np.ndarray):
+            maxes = np.maximum.reduceat(feature, starts).tolist()
+        else:
+            ends = starts[1:] + [len(xAxis)]
+            maxes = [float(max(feature[start:end])) for start, end in zip(starts, ends)]
 
         #print averages
 
@@ -422,33 +426,16 @@ class DataFile:
         maxes = []
         mins = []
         medians = []
-        currGen = []
-        currGenNum = 1
-        roundBreaks = self.getRoundBreaks()
+        starts = self.getGroupStarts(xAxis)
+        ends = starts[1:] + [len(xAxis)]
+        for start, end in zip(starts, ends):
+            sortedGen = sorted(feature[start:end])
+            maxes.append(sortedGen[-1])
+            mins.append(sortedGen[0])
+            medians.append(sortedGen[len(sortedGen) / 2])
         breakPlots = []
-        for i in range(len(xAxis)):
-            currGen.append(feature[i])
-
-            if showRoundBreaks and i in roundBreaks:
-                breakPlots.append([currGenNum, currGenNum])
-                breakPlots.append([0, absoluteMax])
-
-            if i == len(xAxis)-1:
-                sortedGen = sorted(currGen)
-                maxes.append(sortedGen[-1])
-                mins.append(sortedGen[0])
-                medians.append(sortedGen[len(sortedGen) / 2])
-                currGen = []
-                currGenNum += 1
-                break
-
-            if xAxis[i] != xAxis[i+1]:
-                sortedGen = sorted(currGen)
-                maxes.append(sortedGen[-1])
-                mins.append(sortedGen[0])
-                medians.append(sortedGen[len(sortedGen) / 2])
-                currGen = []
-                currGenNum += 1
+        if showRoundBreaks:
+            breakPlots = self.getBreakPlots(starts, absoluteMax)
 
         xMax = range(len(maxes)+1)[1:]
         plot(xMax, medians, label="Median")
@@ -479,14 +466,34 @@ class DataFile:
             savefig(self.figFolder + self.fileName[23:len(self.fileName)-4] + filename + ".png", format="png")
         clf()
 
+    def getGroupStarts(self, xAxis):
+        """
+        Returns the indices where each run of equal values in the xAxis column starts, 0 first.
+        """
+        if np is not None and isinstance(xAxis, np.ndarray):
+            return [0] + (np.flatnonzero(np.diff(xAxis)) + 1).tolist()
+        starts = [0]
+        for i in range(len(xAxis) - 1):
+            if xAxis[i + 1] != xAxis[i]:
+                starts.append(i + 1)
+        return starts
+
+    def getBreakPlots(self, starts, absoluteMax):
+        """
+        Returns the lines marking where each new EEA round begins, on a graph with one point per group in starts.
+        """
+        breakPlots = []
+        for roundBreak in self.getRoundBreaks():
+            currGenNum = bisect.bisect_right(starts, roundBreak)
+            breakPlots.append([currGenNum, currGenNum])
+            breakPlots.append([0, absoluteMax])
+        return breakPlots
+
     def getRoundBreaks(self):
         """
         Returns what indices are the start of a new round.
         """
-        breaks = []
-        for i in range(len(self.roundNum) - 1):
-            if self.roundNum[i + 1] != self.roundNum[i]:
-                breaks.append(i + 1)
+        breaks = self.getGroupStarts(self.roundNum)[1:]
 
         print "num rounds: " + str(self.roundNum[-1])
         print breaks
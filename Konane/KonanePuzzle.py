@@ -5,8 +5,12 @@
 __author__ = 'julian'
 
 from copy import copy
+from itertools import count
 
 class KonanePuzzle:
+    # Hands out a unique id to every puzzle made, so results can be cached per puzzle
+    idCounter = count()
+
     def __init__(self, boardState, side, result = None):
         """
         :param boardState: the state the opponent responds to
@@ -17,6 +21,9 @@ class KonanePuzzle:
         self.state = boardState
         self.side = side
         self.result = result
+        self.puzzleId = self.idCounter.next()
+        # (model weights, depth) -> the move that model makes for this puzzle, filled in by TestSuite
+        self.modelResponses = {}
 
     def getResult(self, opponent):
         """
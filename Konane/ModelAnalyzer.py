@@ -5,8 +5,8 @@
 # Date: 2/19/15
 __author__ = 'julian'
 
-import FigMaker, johnMinimaxEvolved, randomBoardStates, random, StaticEvalModel, os
-import gakonane
+import FigMaker, johnMinimaxEvolved, randomBoardStates, random, StaticEvalModel, os, sys
+import gakonane, multiprocessing, OpponentOracle, ParallelEvaluator
 from datetime import datetime
 
 class ModelAnalyzer:
@@ -18,6 +18,8 @@ class ModelAnalyzer:
         self.modelPlayer.model = self.getModelFromDataFile(self.dataFile)
 
         self.opponent = opponent
+        # Set to a ParallelEvaluator to search on worker processes
+        self.evaluator = None
         if generator is not None:
             self.moveGenerator = generator
         else:
@@ -31,10 +33,8 @@ class ModelAnalyzer:
         :return: StaticEvalModel with best model from the given dataFile
         """
         numRounds = dataFile.getNumGenerations()
-        start = dataFile.roundNum.index(numRounds)
-        percentCorrects = []
-        for i in range(start, len(dataFile.roundNum)):
-            percentCorrects.append(dataFile.percentCorrect[i])
+        start = dataFile.indexOf("roundNum", numRounds)
+        percentCorrects = dataFile.percentCorrect[start:].tolist()
 
         correctMax = max(percentCorrects)
         bestIndex = len(percentCorrects) - 1
@@ -42,12 +42,7 @@ class ModelAnalyzer:
             bestIndex -= 1
 
         modelToRet = StaticEvalModel.StaticEvalModel(self.attrFile.boardSize)
-        modelToRet.myMovesWeight = dataFile.myMovesWeight[bestIndex]
-        modelToRet.theirMovesWeight = dataFile.theirMovesWeight[bestIndex]
-        modelToRet.myPiecesWeight = dataFile.myPiecesWeight[bestIndex]
-        modelToRet.theirPiecesWeight = dataFile.theirPiecesWeight[bestIndex]
-        modelToRet.myMovableWeight = dataFile.myMovableWeight[bestIndex]
-        modelToRet.theirMovableWeight = dataFile.theirMovableWeight[bestIndex]
+        modelToRet.setWeights(dataFile.getWeights(bestIndex))
 
         return modelToRet
 
@@ -60,10 +55,8 @@ class ModelAnalyzer:
         """
         models = []
         numRounds = dataFile.getNumGenerations()
-        start = dataFile.roundNum.index(numRounds)
-        percentCorrects = []
-        for i in range(start, len(dataFile.roundNum)):
-            percentCorrects.append(dataFile.percentCorrect[i])
+        start = dataFile.indexOf("roundNum", numRounds)
+        percentCorrects = dataFile.percentCorrect[start:].tolist()
 
         correctMax = max(percentCorrects)
         curr = len(percentCorrects) - 1
@@ -75,12 +68,7 @@ class ModelAnalyzer:
                     if count > N:
                         break
                 modelToAdd = StaticEvalModel.StaticEvalModel(self.attrFile.boardSize)
-                modelToAdd.myMovesWeight = dataFile.myMovesWeight[curr]
-                modelToAdd.theirMovesWeight = dataFile.theirMovesWeight[curr]
-                modelToAdd.myPiecesWeight = dataFile.myPiecesWeight[curr]
-                modelToAdd.theirPiecesWeight = dataFile.theirPiecesWeight[curr]
-                modelToAdd.myMovableWeight = dataFile.myMovableWeight[curr]
-                modelToAdd.theirMovableWeight = dataFile.theirMovableWeight[curr]
+                modelToAdd.setWeights(dataFile.getWeights(curr))
                 models.append(modelToAdd)
             curr -= 1
 
@@ -92,6 +80,8 @@ class ModelAnalyzer:
         they agree on the result.
         :return: None
         """
+        if self.evaluator is not None:
+            return self.analyzeParallel(N)
         testedPuzzles = []
         try:
             count = 0
@@ -119,40 +109,133 @@ class ModelAnalyzer:
 
         return self.modelPlayer.model.getCorrectPercent() * 100.0
 
-def folderAnalyzer(folderName):
+    def analyzeOracle(self, oracle):
+        """
+        Grades self.modelPlayer against the opponent's saved answers in an OpponentOracle,
+        so the opponent does not have to search anything.
+        :return: The percent of the oracle's puzzles the model agreed with the opponent on
+        """
+        if self.evaluator is not None:
+            modelWeights = self.modelPlayer.model.getWeightsKey()
+            modelMoves = self.evaluator.getMoves([(modelWeights, board, side, self.modelPlayer.limit)
+                                                  for board, side, oppMove in oracle.puzzles])
+        else:
+            modelMoves = []
+            for board, side, oppMove in oracle.puzzles:
+                self.modelPlayer.setSide(side)
+                modelMoves.append(self.modelPlayer.getMove(board))
+        for (board, side, oppMove), modelMove in zip(oracle.puzzles, modelMoves):
+            self.modelPlayer.model.numTested += 1
+            if oppMove == modelMove:
+                self.modelPlayer.model.numCorrect += 1
+
+        return self.modelPlayer.model.getCorrectPercent() * 100.0
+
+    def analyzeParallel(self, N):
+        """
+        Same as analyze, but draws the N puzzles first and then searches them all on self.evaluator.
+        The opponent's moves are searched on the workers too if it is a MinimaxPlayer, since only those
+        can be rebuilt from their weights.
+        :return: The percent of puzzles the model agreed with the opponent on
+        """
+        testedPuzzles = []
+        sides = []
+        for count in range(N):
+            side = random.choice(["W", "B"])
+            board = self.moveGenerator.getRandom(side)
+            if board not in testedPuzzles: #Skip duplicates
+                testedPuzzles.append(board)
+                sides.append(side)
+
+        modelWeights = self.modelPlayer.model.getWeightsKey()
+        jobs = [(modelWeights, board, side, self.modelPlayer.limit) for board, side in zip(testedPuzzles, sides)]
+        if isinstance(self.opponent, johnMinimaxEvolved.MinimaxPlayer):
+            oppWeights = self.opponent.model.getWeightsKey()
+            jobs += [(oppWeights, board, side, self.opponent.limit) for board, side in zip(testedPuzzles, sides)]
+            moves = self.evaluator.getMoves(jobs)
+            modelMoves = moves[:len(testedPuzzles)]
+            oppMoves = moves[len(testedPuzzles):]
+        else:
+            modelMoves = self.evaluator.getMoves(jobs)
+            oppMoves = []
+            for board, side in zip(testedPuzzles, sides):
+                self.opponent.setSide(side)
+                oppMoves.append(self.opponent.getMove(board))
+
+        for oppMove, modelMove in zip(oppMoves, modelMoves):
+            self.modelPlayer.model.numTested += 1
+            if oppMove == modelMove:
+                self.modelPlayer.model.numCorrect += 1
+
+        return self.modelPlayer.model.getCorrectPercent() * 100.0
+
+def getOracle(analyzer, folderName, dataFileName, numPuzzles, seed, rootSearcher = None):
+    """
+    Gets the benchmark oracle for one data file's opponent, saved next to the analysis output.
+    :param rootSearcher: A RootParallelSearch.RootParallelSearcher for the opponent to search each puzzle with,
+        so a deep opponent answers on every core. None to search in this process.
+    """
+    analyzer.opponent.rootSearcher = rootSearcher
+    oracleFileName = folderName + "oracle" + dataFileName + "-" + str(numPuzzles) + "-" + str(seed) + ".p"
+    return OpponentOracle.OpponentOracle(analyzer.opponent, analyzer.moveGenerator, numPuzzles, seed, oracleFileName)
+
+def getEvaluator(processes):
+    """
+    :return: A ParallelEvaluator with processes worker processes, or None if processes is None.
+        The caller closes it when done.
+    """
+    if processes is None:
+        return None
+    return ParallelEvaluator.ParallelEvaluator(processes)
+
+def folderAnalyzer(folderName, seed = 0, rootSearcher = None, processes = None):
+    """
+    :param processes: Number of worker processes to search the models' moves on, None to search in this process.
+    """
     dataFileList = sorted(os.listdir(folderName + "/data/"))
     attrFileList = sorted(os.listdir(folderName + "/attr/"))
     outputFile = open(folderName + str(datetime.now()) + "modelAnalysis.txt", "w+", 1)
     moveGen = randomBoardStates.RandomStateGenerator(boardSize=6)
+    evaluator = getEvaluator(processes)
 
-    for i in range(len(dataFileList)):
-        modelsPercentCorrects = {}
-        print "Now on " + str(i) + ": " + str(dataFileList[i])
-        attrFileName = folderName + "attr/" + attrFileList[i]
-        dataFileName = folderName + "data/" + dataFileList[i]
-        attrFile= FigMaker.AttrFile(attrFileName)
-        opponent = getOpponentFromAttrFile(attrFile)
-        analyzer = ModelAnalyzer(attrFileName, dataFileName, opponent, generator=moveGen)
-        bestModels = analyzer.getBestModelsFromDataFile(analyzer.dataFile, N=1000) #only 2K models for now
-        print str(len(bestModels)) + " models to analyze for this file."
-        outputFile.write(str(len(bestModels)) + " models to analyze for this file." + "\n")
-        for model in bestModels:
-            analyzer.modelPlayer.model = model
+    try:
+        for i in range(len(dataFileList)):
+            modelsPercentCorrects = {}
+            print "Now on " + str(i) + ": " + str(dataFileList[i])
+            attrFileName = folderName + "attr/" + attrFileList[i]
+            dataFileName = folderName + "data/" + dataFileList[i]
+            attrFile= FigMaker.AttrFile(attrFileName)
+            opponent = getOpponentFromAttrFile(attrFile)
+            analyzer = ModelAnalyzer(attrFileName, dataFileName, opponent, generator=moveGen)
+            analyzer.evaluator = evaluator
+            bestModels = analyzer.getBestModelsFromDataFile(analyzer.dataFile, N=1000) #only 2K models for now
+            print str(len(bestModels)) + " models to analyze for this file."
+            outputFile.write(str(len(bestModels)) + " models to analyze for this file." + "\n")
+            # The opponent answers each benchmark puzzle once, every model is graded against those answers
+            oracle = getOracle(analyzer, folderName, dataFileList[i], 130, seed, rootSearcher)
+            for model in bestModels:
+                analyzer.modelPlayer.model = model
 
-            percentCorrect = analyzer.analyze(130)
-            modelsPercentCorrects[model] = percentCorrect
+                percentCorrect = analyzer.analyzeOracle(oracle)
+                modelsPercentCorrects[model] = percentCorrect
+
+            bestEntry = max(modelsPercentCorrects.items(), key = lambda x: x[1])
+            print "Models depth: " + str(analyzer.attrFile.modelsDepth)
+            print "Opponent depth: " + str(analyzer.attrFile.oppDepth)
+            print "Best model for the file was: " + str(bestEntry[0])
+            print "Percent was: " + str(bestEntry[1])
+            outputFile.write("Models depth: " + str(analyzer.attrFile.modelsDepth) + "\n")
+            outputFile.write("Opponent depth: " + str(analyzer.attrFile.oppDepth) + "\n")
+            outputFile.write("Best model for the file was: " + str(bestEntry[0]) + "\n")
+            outputFile.write("Percent was: " + str(bestEntry[1]) + "\n")
+    finally:
+        if evaluator is not None:
+            evaluator.close()
 
-        bestEntry = max(modelsPercentCorrects.items(), key = lambda x: x[1])
-        print "Models depth: " + str(analyzer.attrFile.modelsDepth)
-        print "Opponent depth: " + str(analyzer.attrFile.oppDepth)
-        print "Best model for the file was: " + str(bestEntry[0])
-        print "Percent was: " + str(bestEntry[1])
-        outputFile.write("Models depth: " + str(analyzer.attrFile.modelsDepth) + "\n")
-        outputFile.write("Opponent depth: " + str(analyzer.attrFile.oppDepth) + "\n")
-        outputFile.write("Best model for the file was: " + str(bestEntry[0]) + "\n")
-        outputFile.write("Percent was: " + str(bestEntry[1]) + "\n")
-
-def analyzeOne(dataFileList, attrFileList, i, moveGen, folderName):
+def analyzeOne(dataFileList, attrFileList, i, moveGen, folderName, seed = 0, rootSearcher = None, processes = None):
+    """
+    :param processes: Number of worker processes to search the models' moves on, None to search in this process.
+    """
     outputFile = open(folderName + "modelAnalysis" + dataFileList[i] + ".txt", "w+", 1)
     modelsPercentCorrects = {}
     print "Now on " + str(i) + ": " + str(dataFileList[i])
@@ -164,11 +247,18 @@ def analyzeOne(dataFileList, attrFileList, i, moveGen, folderName):
     bestModels = analyzer.getBestModelsFromDataFile(analyzer.dataFile, N=2000) #only 2K models for now
     print str(len(bestModels)) + " models to analyze for this file."
     outputFile.write(str(len(bestModels)) + " models to analyze for this file." + "\n")
-    for model in bestModels:
-        analyzer.modelPlayer.model = model
+    # The opponent answers each benchmark puzzle once, every model is graded against those answers
+    oracle = getOracle(analyzer, folderName, dataFileList[i], 500, seed, rootSearcher)
+    analyzer.evaluator = getEvaluator(processes)
+    try:
+        for model in bestModels:
+            analyzer.modelPlayer.model = model
 
-        percentCorrect = analyzer.analyze(500)
-        modelsPercentCorrects[model] = percentCorrect
+            percentCorrect = analyzer.analyzeOracle(oracle)
+            modelsPercentCorrects[model] = percentCorrect
+    finally:
+        if analyzer.evaluator is not None:
+            analyzer.evaluator.close()
 
     bestEntry = max(modelsPercentCorrects.items(), key = lambda x: x[1])
     print "Models depth: " + str(analyzer.attrFile.modelsDepth)
@@ -180,7 +270,10 @@ def analyzeOne(dataFileList, attrFileList, i, moveGen, folderName):
     outputFile.write("Best model for the file was: " + str(bestEntry[0]) + "\n")
     outputFile.write("Percent was: " + str(bestEntry[1]) + "\n")
 
-def analyzeInternetPlayer():
+def analyzeInternetPlayer(processes = None):
+    """
+    :param processes: Number of worker processes to search the model's moves on, None to search in this process.
+    """
     dataFileName = "data/fromInternet/data/data-2015-02-18 19_53_31.csv"
     attrFileName = "data/fromInternet/attr/attr-2015-02-18 19_53_31.csv"
 
@@ -188,8 +281,13 @@ def analyzeInternetPlayer():
 
     opponent = getOpponentFromOnlineAttrFile()
     analyzer = ModelAnalyzer(attrFileName, dataFileName, opponent)
+    analyzer.evaluator = getEvaluator(processes)
 
-    print analyzer.analyze(1000)
+    try:
+        print analyzer.analyze(1000)
+    finally:
+        if analyzer.evaluator is not None:
+            analyzer.evaluator.close()
 
 def getOpponentFromOnlineAttrFile():
     opponent = gakonane.KOnane(6, 3)
@@ -212,5 +310,9 @@ def getOpponentFromAttrFile(attrFile):
 
 
 if __name__ == "__main__":
-    folderAnalyzer("data/CLA/")
-    #analyzeInternetPlayer()
+    # Pass --processes to search the models on every core
+    processes = None
+    if "--processes" in sys.argv:
+        processes = multiprocessing.cpu_count()
+    folderAnalyzer("data/CLA/", processes=processes)
+    #analyzeInternetPlayer(processes)
@@ -1,20 +1,25 @@
-# Analyzes models by seeing what percent of moves out of thousands of random moves they correctly predict
-# Versus an opponent. Opponent must be willing to give thousands of moves for this to work.
+# Analyzes models by seeing what percent of moves out of hundreds of random moves they correctly predict
+# Versus an opponent. The opponent answers each file's seeded benchmark puzzles once (an OpponentOracle)
+# and every model of the file is graded against those answers.
 #
 # Author: Julian Jocque
 # Date: 2/19/15
 __author__ = 'julian'
 
 import FigMaker, johnMinimaxEvolved, randomBoardStates, random, StaticEvalModel, os
-import gakonane, threading
+import gakonane, multiprocessing, OpponentOracle
 
 class ModelAnalyzer:
     def __init__(self, attrFileName, dataFileName, opponent, generator = None):
+        """
+        If dataFileName is None the data file is not read and the model player starts with a default model.
+        """
         self.attrFile = FigMaker.AttrFile(attrFileName)
-        self.dataFile = FigMaker.DataFile(dataFileName, self.attrFile)
         self.modelPlayer = johnMinimaxEvolved.MinimaxPlayer(self.attrFile.boardSize, self.attrFile.modelsDepth)
         self.modelPlayer.initialize("W")
-        self.modelPlayer.model = self.getModelFromDataFile(self.dataFile)
+        if dataFileName is not None:
+            self.dataFile = FigMaker.DataFile(dataFileName, self.attrFile)
+            self.modelPlayer.model = self.getModelFromDataFile(self.dataFile)
 
         self.opponent = opponent
         if generator is not None:
@@ -30,10 +35,8 @@ class ModelAnalyzer:
         :return: StaticEvalModel with best model from the given dataFile
         """
         numRounds = dataFile.getNumGenerations()
-        start = dataFile.roundNum.index(numRounds)
-        percentCorrects = []
-        for i in range(start, len(dataFile.roundNum)):
-            percentCorrects.append(dataFile.percentCorrect[i])
+        start = dataFile.indexOf("roundNum", numRounds)
+        percentCorrects = dataFile.percentCorrect[start:].tolist()
 
         correctMax = max(percentCorrects)
         bestIndex = len(percentCorrects) - 1
@@ -41,12 +44,7 @@ class ModelAnalyzer:
             bestIndex -= 1
 
         modelToRet = StaticEvalModel.StaticEvalModel(self.attrFile.boardSize)
-        modelToRet.myMovesWeight = dataFile.myMovesWeight[bestIndex]
-        modelToRet.theirMovesWeight = dataFile.theirMovesWeight[bestIndex]
-        modelToRet.myPiecesWeight = dataFile.myPiecesWeight[bestIndex]
-        modelToRet.theirPiecesWeight = dataFile.theirPiecesWeight[bestIndex]
-        modelToRet.myMovableWeight = dataFile.myMovableWeight[bestIndex]
-        modelToRet.theirMovableWeight = dataFile.theirMovableWeight[bestIndex]
+        modelToRet.setWeights(dataFile.getWeights(bestIndex))
 
         return modelToRet
 
@@ -59,10 +57,8 @@ class ModelAnalyzer:
         """
         models = []
         numRounds = dataFile.getNumGenerations()
-        start = dataFile.roundNum.index(numRounds)
-        percentCorrects = []
-        for i in range(start, len(dataFile.roundNum)):
-            percentCorrects.append(dataFile.percentCorrect[i])
+        start = dataFile.indexOf("roundNum", numRounds)
+        percentCorrects = dataFile.percentCorrect[start:].tolist()
 
         correctMax = max(percentCorrects)
         curr = len(percentCorrects) - 1
@@ -74,12 +70,7 @@ class ModelAnalyzer:
                     if count > N:
                         break
                 modelToAdd = StaticEvalModel.StaticEvalModel(self.attrFile.boardSize)
-                modelToAdd.myMovesWeight = dataFile.myMovesWeight[curr]
-                modelToAdd.theirMovesWeight = dataFile.theirMovesWeight[curr]
-                modelToAdd.myPiecesWeight = dataFile.myPiecesWeight[curr]
-                modelToAdd.theirPiecesWeight = dataFile.theirPiecesWeight[curr]
-                modelToAdd.myMovableWeight = dataFile.myMovableWeight[curr]
-                modelToAdd.theirMovableWeight = dataFile.theirMovableWeight[curr]
+                modelToAdd.setWeights(dataFile.getWeights(curr))
                 models.append(modelToAdd)
             curr -= 1
 
@@ -118,49 +109,138 @@ class ModelAnalyzer:
 
         return self.modelPlayer.model.getCorrectPercent() * 100.0
 
-def folderAnalyzer(folderName):
+    def analyzeOracle(self, oracle):
+        """
+        Grades self.modelPlayer against the opponent's saved answers in an OpponentOracle,
+        so the opponent does not have to search anything.
+        :return: The percent of the oracle's puzzles the model agreed with the opponent on
+        """
+        modelMoves = []
+        for board, side, oppMove in oracle.puzzles:
+            self.modelPlayer.setSide(side)
+            modelMoves.append(self.modelPlayer.getMove(board))
+        for (board, side, oppMove), modelMove in zip(oracle.puzzles, modelMoves):
+            self.modelPlayer.model.numTested += 1
+            if oppMove == modelMove:
+                self.modelPlayer.model.numCorrect += 1
+
+        return self.modelPlayer.model.getCorrectPercent() * 100.0
+
+# The random state generator of a worker process, loaded once by initWorker
+workerMoveGen = None
+
+def initWorker(boardSize):
+    global workerMoveGen
+    workerMoveGen = randomBoardStates.RandomStateGenerator(boardSize=boardSize)
+
+def getOracle(attrFileName, oracleFileName, numPuzzles, seed):
+    """
+    Gets the benchmark oracle for one file's opponent, loading it from oracleFileName if it was saved already.
+    """
+    opponent = getOpponentFromAttrFile(FigMaker.AttrFile(attrFileName))
+    return OpponentOracle.OpponentOracle(opponent, workerMoveGen, numPuzzles, seed, oracleFileName)
+
+def loadBestModels(task):
+    """
+    Reads one (attr, data) file pair in a worker process, and has the file's opponent answer
+    the benchmark puzzles once so the models can all be graded against the saved answers.
+    :param task: (file index, attr file name, data file name, max number of models,
+        oracle file name, number of puzzles, seed)
+    :return: (file index, list of the best models' weights)
+    """
+    i, attrFileName, dataFileName, N, oracleFileName, numPuzzles, seed = task
+    analyzer = ModelAnalyzer(attrFileName, dataFileName, None, generator=workerMoveGen)
+    bestModels = analyzer.getBestModelsFromDataFile(analyzer.dataFile, N=N)
+    getOracle(attrFileName, oracleFileName, numPuzzles, seed)
+    return (i, [model.getWeightsKey() for model in bestModels])
+
+def analyzeModels(task):
+    """
+    Grades some of the models of one file against that file's saved oracle in a worker process.
+    :param task: (file index, attr file name, list of model weights, oracle file name, number of puzzles, seed)
+    :return: (file index, list of (weights, percent correct) in the same order)
+    """
+    i, attrFileName, weightsList, oracleFileName, numPuzzles, seed = task
+    attrFile = FigMaker.AttrFile(attrFileName)
+    oracle = getOracle(attrFileName, oracleFileName, numPuzzles, seed)
+    analyzer = ModelAnalyzer(attrFileName, None, None, generator=workerMoveGen)
+    results = []
+    for weights in weightsList:
+        model = StaticEvalModel.StaticEvalModel(attrFile.boardSize)
+        model.setWeights(weights)
+        analyzer.modelPlayer.model = model
+        results.append((weights, analyzer.analyzeOracle(oracle)))
+    return (i, results)
+
+def folderAnalyzer(folderName, processes = None, modelsPerTask = 25, numModels = 2000, numPuzzles = 500, seed = 0):
+    """
+    Analyzes every (attr, data) file pair in the folder on a pool of worker processes.
+    The files are read, and their opponents' benchmark answers found, in parallel first. Then every
+    file's models are split into tasks of modelsPerTask models, so all cores stay busy even when there
+    are fewer files than cores. Each file's results are written to its own output file as soon as all
+    of its models are done.
+    :param processes: Number of worker processes, defaults to the number of cores.
+    :param seed: Seed for drawing the benchmark puzzles every model is graded on.
+    """
     dataFileList = sorted(os.listdir(folderName + "/data/"))
     attrFileList = sorted(os.listdir(folderName + "/attr/"))
-    moveGen = randomBoardStates.RandomStateGenerator(boardSize=6)
-
-    threads = []
-    for i in range(len(dataFileList)):
-        t = threading.Thread(target=analyzeOne, args=(dataFileList, attrFileList, i, moveGen, folderName))
-        t.setDaemon(True)
-        threads.append(t)
-
-    for t in threads:
-        t.start()
-    for t in threads:
-        t.join()
-
-def analyzeOne(dataFileList, attrFileList, i, moveGen, folderName):
-    outputFile = open(folderName + "modelAnalysis" + dataFileList[i] + ".txt", "w+", 1)
-    modelsPercentCorrects = {}
-    print "Now on " + str(i) + ": " + str(dataFileList[i])
-    attrFileName = folderName + "attr/" + attrFileList[i]
-    dataFileName = folderName + "data/" + dataFileList[i]
-    attrFile= FigMaker.AttrFile(attrFileName)
-    opponent = getOpponentFromAttrFile(attrFile)
-    analyzer = ModelAnalyzer(attrFileName, dataFileName, opponent, generator=moveGen)
-    bestModels = analyzer.getBestModelsFromDataFile(analyzer.dataFile, N=2000) #only 2K models for now
-    print str(len(bestModels)) + " models to analyze for this file."
-    outputFile.write(str(len(bestModels)) + " models to analyze for this file." + "\n")
-    for model in bestModels:
-        analyzer.modelPlayer.model = model
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(processes, initWorker, (6,))
+
+    attrFileNames = [folderName + "attr/" + attrFileName for attrFileName in attrFileList]
+    oracleFileNames = [folderName + "oracle" + dataFileName + "-" + str(numPuzzles) + "-" + str(seed) + ".p"
+                       for dataFileName in dataFileList]
+    loadTasks = [(i, attrFileNames[i], folderName + "data/" + dataFileList[i], numModels,
+                  oracleFileNames[i], numPuzzles, seed) for i in range(len(dataFileList))]
+    analyzeTasks = []
+    remainingTasks = {}
+    for i, weightsList in pool.imap_unordered(loadBestModels, loadTasks):
+        print "Now on " + str(i) + ": " + str(dataFileList[i])
+        print str(len(weightsList)) + " models to analyze for this file."
+        if not weightsList:
+            # No analysis task will finish for this file, so its (empty) results are written now
+            writeFileResults(folderName, dataFileList[i], attrFileNames[i], [])
+            continue
+        remainingTasks[i] = 0
+        for start in range(0, len(weightsList), modelsPerTask):
+            analyzeTasks.append((i, attrFileNames[i], weightsList[start:start + modelsPerTask],
+                                 oracleFileNames[i], numPuzzles, seed))
+            remainingTasks[i] += 1
+
+    fileResults = dict([(i, []) for i in remainingTasks])
+    for i, results in pool.imap_unordered(analyzeModels, analyzeTasks):
+        fileResults[i].extend(results)
+        remainingTasks[i] -= 1
+        if remainingTasks[i] == 0:
+            writeFileResults(folderName, dataFileList[i], attrFileNames[i], fileResults.pop(i))
+    pool.close()
+    pool.join()
 
-        percentCorrect = analyzer.analyze(500)
-        modelsPercentCorrects[model] = percentCorrect
-
-    bestEntry = max(modelsPercentCorrects.items(), key = lambda x: x[1])
-    print "Models depth: " + str(analyzer.attrFile.modelsDepth)
-    print "Opponent depth: " + str(analyzer.attrFile.oppDepth)
-    print "Best model for the file was: " + str(bestEntry[0])
-    print "Percent was: " + str(bestEntry[1])
-    outputFile.write("Models depth: " + str(analyzer.attrFile.modelsDepth) + "\n")
-    outputFile.write("Opponent depth: " + str(analyzer.attrFile.oppDepth) + "\n")
-    outputFile.write("Best model for the file was: " + str(bestEntry[0]) + "\n")
-    outputFile.write("Percent was: " + str(bestEntry[1]) + "\n")
+def writeFileResults(folderName, dataFileName, attrFileName, results):
+    """
+    Writes the analysis of one data file, in the same format as ModelAnalyzer.analyzeOne.
+    :param results: List of (weights, percent correct) for every model of the file
+    """
+    outputFile = open(folderName + "modelAnalysis" + dataFileName + ".txt", "w+", 1)
+    attrFile = FigMaker.AttrFile(attrFileName)
+    outputFile.write(str(len(results)) + " models to analyze for this file." + "\n")
+    if not results:
+        outputFile.close()
+        return
+    bestWeights, bestPercent = max(results, key = lambda x: x[1])
+    bestModel = StaticEvalModel.StaticEvalModel(attrFile.boardSize)
+    bestModel.setWeights(bestWeights)
+    print "File: " + dataFileName
+    print "Models depth: " + str(attrFile.modelsDepth)
+    print "Opponent depth: " + str(attrFile.oppDepth)
+    print "Best model for the file was: " + str(bestModel)
+    print "Percent was: " + str(bestPercent)
+    outputFile.write("Models depth: " + str(attrFile.modelsDepth) + "\n")
+    outputFile.write("Opponent depth: " + str(attrFile.oppDepth) + "\n")
+    outputFile.write("Best model for the file was: " + str(bestModel) + "\n")
+    outputFile.write("Percent was: " + str(bestPercent) + "\n")
+    outputFile.close()
 
 def analyzeInternetPlayer():
     dataFileName = "data/fromInternet/data/data-2015-02-18 19_53_31.csv"
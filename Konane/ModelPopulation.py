@@ -0,0 +1,144 @@
+## A whole population of StaticEvalModels with every weight in one NumPy array.
+## Row i of weights holds model i's weights in featuresNameList order. The models themselves are ModelViews,
+## StaticEvalModels that read and write their row instead of keeping their own weights, so staticEval,
+## dumpModel, getWeightsKey and the rest work unchanged. Mutating and crossing over a generation is done
+## on the whole array at once instead of feature by feature with getattr/setattr.
+##
+## Needs NumPy, use isAvailable() to check before using it.
+
+import random
+import StaticEvalModel
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def isAvailable():
+    return np is not None
+
+class ModelView(StaticEvalModel.StaticEvalModel):
+    """
+    A StaticEvalModel whose weights are one row of a ModelPopulation's weights.
+    Everything that isn't a weight (numCorrect, diversity, ...) is kept on the view as usual.
+    """
+    def __init__(self, population, row):
+        self.__dict__["population"] = population
+        self.__dict__["row"] = row
+        # Sets the default weights through __setattr__, the same values the population starts with
+        StaticEvalModel.StaticEvalModel.__init__(self, population.size)
+
+    def __getattr__(self, name):
+        # Only called for attributes that aren't on the view, which is where the weights are
+        index = self.population.featureIndices.get(name)
+        if index is None:
+            raise AttributeError(name)
+        return self.getWeightsKey()[index]
+
+    def __setattr__(self, name, value):
+        index = self.population.featureIndices.get(name)
+        if index is None:
+            self.__dict__[name] = value
+        else:
+            self.population.weights[self.row, index] = value
+            self.population.version += 1
+
+    def getWeightsKey(self):
+        # Converting the row is slow next to staticEval, so the tuple is kept until the population changes
+        if self.__dict__.get("keyVersion") != self.population.version:
+            self.__dict__["weightsKey"] = tuple(self.population.weights[self.row].tolist())
+            self.__dict__["keyVersion"] = self.population.version
+        return self.__dict__["weightsKey"]
+
+    def evalFeatures(self, features):
+        myMovesWeight, theirMovesWeight, myPiecesWeight, theirPiecesWeight, myMovableWeight, theirMovableWeight = \
+            self.getWeightsKey()
+        myMoves, theirMoves, myPieces, theirPieces, myMovable, theirMovable = features
+        return ((myMoves * myMovesWeight) - (theirMoves * theirMovesWeight)) \
+                    + ((myPieces * myPiecesWeight) - (theirPieces * theirPiecesWeight)) \
+                    + ((myMovable * myMovableWeight) - (theirMovable * theirMovableWeight))
+
+    def detach(self):
+        """
+        :return: A plain StaticEvalModel with this view's weights and stats, that no longer changes with the population.
+        """
+        model = StaticEvalModel.StaticEvalModel(self.size)
+        for name, value in self.__dict__.items():
+            if name not in ("population", "row", "weightsKey", "keyVersion"):
+                setattr(model, name, value)
+        model.setWeights(self.getWeightsKey())
+        return model
+
+    def crossOver(self, other):
+        # A copy of a view would share its row, so the child is a plain model
+        return self.detach().crossOver(other)
+
+class ModelPopulation:
+    # Stats a child gets from its first parent, like the copy StaticEvalModel.crossOver makes
+    statNames = ("numCorrect", "numTested", "diversity")
+
+    def __init__(self, size, numModels):
+        """
+        Makes a population of numModels default models, every weight 1.0 like a new StaticEvalModel.
+        """
+        self.size = size
+        self.version = 0 # Changed whenever weights changes, see ModelView.getWeightsKey
+        template = StaticEvalModel.StaticEvalModel(size)
+        self.featuresNameList = template.featuresNameList
+        self.featureIndices = dict((name, i) for i, name in enumerate(self.featuresNameList))
+        self.chanceToMutate = template.chanceToMutate
+        self.mutateAmount = template.mutateAmount
+        self.weights = np.ones((numModels, len(self.featuresNameList)), dtype=np.float64)
+        self.models = [ModelView(self, row) for row in xrange(numModels)]
+
+    def getRandomState(self):
+        """
+        :return: A NumPy generator seeded from the random module, so seeding random still repeats a run.
+        """
+        return np.random.RandomState(random.getrandbits(32))
+
+    def mutateWeights(self, weights, rand):
+        """
+        Mutates every row of weights in place the way StaticEvalModel.mutate mutates one model: each weight
+        has a chanceToMutate percent chance (random.randint(0, 100) <= chanceToMutate) to move by up to
+        mutateAmount / 2 either way.
+        """
+        chance = (min(self.chanceToMutate, 100) + 1) / 101.0
+        mutating = rand.random_sample(weights.shape) < chance
+        amounts = rand.uniform(-self.mutateAmount / 2.0, self.mutateAmount / 2.0, weights.shape)
+        weights += np.where(mutating, amounts, 0.0)
+
+    def mutate(self, times = 1):
+        """
+        Mutates every model, times times over.
+        """
+        rand = self.getRandomState()
+        for i in xrange(times):
+            self.mutateWeights(self.weights, rand)
+        self.version += 1
+
+    def breed(self, parents, keep):
+        """
+        Replaces the population with a new generation in one step. Model i becomes the child of the pair
+        parents[i], crossed over and then mutated like StaticEvalModel.crossOver and mutate do, and the
+        last model becomes a copy of the model keep.
+        :param parents: List of (first parent, second parent) models from this population, one per model but the last
+        :param keep: Model from this population carried over unchanged, usually the best one
+        :return: The models
+        """
+        rand = self.getRandomState()
+        firstRows = np.array([first.row for first, second in parents], dtype=np.intp)
+        secondRows = np.array([second.row for first, second in parents], dtype=np.intp)
+        # Each child gets each weight from either parent with a 50/50 chance
+        fromSecond = rand.random_sample((len(parents), self.weights.shape[1])) < 0.5
+        children = np.where(fromSecond, self.weights[secondRows], self.weights[firstRows])
+        self.mutateWeights(children, rand)
+
+        stats = [[getattr(model, name) for name in self.statNames] for model in self.models]
+        childStats = [stats[row] for row in firstRows] + [stats[keep.row]]
+        self.weights = np.vstack([children, self.weights[keep.row]])
+        self.version += 1
+        for model, modelStats in zip(self.models, childStats):
+            for name, value in zip(self.statNames, modelStats):
+                setattr(model, name, value)
+        return self.models
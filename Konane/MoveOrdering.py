@@ -0,0 +1,115 @@
+## Move ordering for the alpha-beta searches.
+## Alpha-beta prunes the most when the best move at a node is searched first, but generateMoves gives the
+## moves in board scan order. MoveOrderer puts the moves most likely to cause a cutoff first: the best move
+## the transposition table remembers for the position, then the killer moves (moves that recently caused a
+## cutoff at the same ply), then the rest by their history score (how much searching they have cut off
+## anywhere in the tree). Moves with the same score keep their generateMoves order.
+##
+## Searches only order the moves of interior nodes and leave the root in generateMoves order. Alpha-beta
+## gives every root move the same value (or bound) whatever order the nodes below it are searched in, so
+## the root still picks exactly the same move, only with fewer nodes searched.
+##
+## The orderer also keeps cutoff statistics for the nodes it ordered, to measure how much it prunes.
+## An orderer with every heuristic turned off keeps the generateMoves order and only counts.
+
+class MoveOrderer:
+    def __init__(self, useTableMove = True, useKillers = True, useHistory = True, numKillers = 2):
+        """
+        :param useTableMove: Whether the transposition table's best move goes first
+        :param useKillers: Whether the killer moves of the ply go next
+        :param useHistory: Whether the remaining moves are sorted by history score
+        :param numKillers: Number of killer moves kept per ply
+        """
+        self.useTableMove = useTableMove
+        self.useKillers = useKillers
+        self.useHistory = useHistory
+        self.numKillers = numKillers
+        self.clear()
+
+    def clear(self):
+        """
+        Forgets the killer moves and history scores and resets the statistics.
+        """
+        self.killers = {} # ply -> the latest moves that caused a cutoff there, newest first
+        self.history = {} # (player, move tuple) -> score
+        self.clearStats()
+
+    def clearStats(self):
+        """
+        Resets the cutoff statistics, keeping what was learnt about the moves.
+        """
+        self.nodes = 0 # Nodes whose moves were ordered
+        self.childrenGenerated = 0 # Moves of those nodes
+        self.childrenSkipped = 0 # Moves of those nodes that a cutoff saved searching
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0 # Cutoffs on the first move searched
+
+    def orderMoves(self, moves, ply, player, tableMove = None):
+        """
+        :param moves: The moves of a node, from generateMoves
+        :param ply: Depth of the node in the search
+        :param player: The player to move at the node
+        :param tableMove: The best move the transposition table has for the node, if any
+        :return: The moves in the order to search them
+        """
+        self.nodes += 1
+        self.childrenGenerated += len(moves)
+        if len(moves) < 2:
+            return moves
+        first = []
+        if self.useTableMove and tableMove is not None and tableMove in moves:
+            first.append(tableMove)
+        if self.useKillers:
+            for killer in self.killers.get(ply, ()):
+                if killer in moves and killer not in first:
+                    first.append(killer)
+        if first:
+            rest = [move for move in moves if move not in first]
+        else:
+            rest = list(moves)
+        if self.useHistory and self.history:
+            history = self.history
+            # sort is stable, so moves with the same score stay in generateMoves order
+            rest.sort(key=lambda move: -history.get((player, tuple(move)), 0))
+        return first + rest
+
+    def recordCutoff(self, move, ply, player, remaining, index, numMoves):
+        """
+        Records that move caused a cutoff.
+        :param remaining: The depth left to search below the node, deeper cutoffs count for more history
+        :param index: Position of move in the order the node's moves were searched
+        :param numMoves: Number of moves the node had
+        """
+        self.cutoffs += 1
+        if index == 0:
+            self.firstMoveCutoffs += 1
+        self.childrenSkipped += numMoves - index - 1
+        if self.useKillers:
+            killers = self.killers.setdefault(ply, [])
+            if move not in killers:
+                killers.insert(0, move)
+                del killers[self.numKillers:]
+        if self.useHistory:
+            key = (player, tuple(move))
+            self.history[key] = self.history.get(key, 0) + remaining * remaining
+
+    def cutoffRate(self):
+        """
+        :return: The fraction of ordered nodes that had a cutoff.
+        """
+        if self.nodes == 0:
+            return 0.0
+        return float(self.cutoffs) / self.nodes
+
+    def firstMoveCutoffRate(self):
+        """
+        :return: The fraction of cutoffs that happened on the first move searched.
+        """
+        if self.cutoffs == 0:
+            return 0.0
+        return float(self.firstMoveCutoffs) / self.cutoffs
+
+    def __str__(self):
+        return "nodes: " + str(self.nodes) + ", cutoffs: " + str(self.cutoffs) \
+               + ", first move cutoff rate: " + str(self.firstMoveCutoffRate()) \
+               + ", children skipped: " + str(self.childrenSkipped) + " of " + str(self.childrenGenerated)
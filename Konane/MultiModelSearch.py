@@ -0,0 +1,126 @@
+## Searches one puzzle for many models at once.
+## Every model in an EEA generation searches the same puzzles to the same depth, so the game tree is the
+## same for all of them and only the leaf values differ. This expands the depth limited tree once, scores
+## every leaf for every model with one matrix product, and backs the values up per model to get each
+## model's move. The moves are the same as johnMinimaxEvolved.MinimaxPlayer.getMove would give.
+##
+## Needs NumPy, use isAvailable() to check before using it.
+
+import updatedKonane
+import StaticEvalModel
+from johnMinimaxEvolved import MinimaxNode
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def isAvailable():
+    return np is not None
+
+class MultiModelSearcher(updatedKonane.Konane):
+    infinity = 5000
+    # staticEval adds the "my" features and subtracts the "their" ones
+    featureSigns = [1.0, -1.0, 1.0, -1.0, 1.0, -1.0]
+
+    def __init__(self, size, depthLimit):
+        updatedKonane.Konane.__init__(self, size)
+        self.limit = depthLimit
+        # Only used to get (cached) raw features, its weights are never used
+        self.featureModel = StaticEvalModel.StaticEvalModel(size)
+
+    def getWeightMatrix(self, models):
+        """
+        :return: A (models x features) matrix of the models' weights, with the sign staticEval gives each feature.
+        """
+        weights = np.array([model.getWeightsKey() for model in models], dtype=np.float64)
+        return weights * np.array(self.featureSigns)
+
+    def getMoves(self, board, side, models):
+        """
+        Gets every model's move for side on board.
+        :param models: StaticEvalModels, all searched to self.limit
+        :return: A list of moves where moves[i] is the move models[i] would make. [] if side has no moves.
+        """
+        moves = self.generateMoves(board, side)
+        if len(moves) == 0:
+            return [[] for model in models]
+        if len(moves) == 1:
+            return [moves[0] for model in models]
+
+        # Expand the tree, recording the leaves' features and each interior node's children
+        self.leafFeatures = []
+        self.terminalValues = []
+        node = MinimaxNode(self.boardCopy(board), None, 0, side)
+        node.hash = self.featureModel.getHasher().hashBoard(board, side)
+        tree = self.expand(node, moves)
+
+        # Score every leaf for every model at once, then back the values up
+        leafValues = np.dot(np.array(self.leafFeatures, dtype=np.float64), self.getWeightMatrix(models).T)
+        for leafIndex, value in self.terminalValues:
+            leafValues[leafIndex, :] = value
+        childValues = np.vstack([self.backUp(child, leafValues) for child in tree[1]])
+        # The first best child wins ties, same as the strict comparisons in alphaBeta
+        if node.maximizing():
+            bestIndices = np.argmax(childValues, axis=0)
+        else:
+            bestIndices = np.argmin(childValues, axis=0)
+        return [moves[i] for i in bestIndices]
+
+    def expand(self, node, moves = None):
+        """
+        Builds the tree under node with applyMove/undoMove.
+        :return: A leaf index for leaves, or (maximizing, [children]) for interior nodes.
+        """
+        if node.depth < self.limit:
+            if moves is None:
+                moves = self.generateMoves(node.state, node.player)
+            if len(moves) > 0:
+                board = node.state
+                player = node.player
+                h = node.hash
+                hasher = self.featureModel.getHasher()
+                maximizing = node.maximizing()
+                node.depth += 1
+                node.player = self.opponent(player)
+                children = []
+                for move in moves:
+                    jumped = self.applyMove(board, player, move)
+                    node.hash = hasher.hashAfterMove(h, player, move, jumped)
+                    children.append(self.expand(node))
+                    self.undoMove(board, player, move, jumped)
+                node.depth -= 1
+                node.player = player
+                node.hash = h
+                return (maximizing, children)
+        return self.addLeaf(node)
+
+    def addLeaf(self, node):
+        """
+        Records the features of a leaf and returns its index. Leaves where the side to move
+        has no moves get the same fixed win/loss value as MinimaxPlayer.eval gives them.
+        """
+        features = self.featureModel.getFeatures(node)
+        index = len(self.leafFeatures)
+        self.leafFeatures.append(features)
+        if features[0] == 0:
+            if node.maximizing():
+                self.terminalValues.append((index, -self.infinity))
+            else:
+                self.terminalValues.append((index, self.infinity))
+        return index
+
+    def backUp(self, tree, leafValues):
+        """
+        :return: The minimax value of tree for every model, as a vector.
+        """
+        if not isinstance(tree, tuple):
+            return leafValues[tree]
+        maximizing, children = tree
+        childValues = np.vstack([self.backUp(child, leafValues) for child in children])
+        if maximizing:
+            values = childValues.max(axis=0)
+        else:
+            values = childValues.min(axis=0)
+        # alphaBeta starts from a (-infinity, infinity) window and never returns values outside it
+        return np.clip(values, -self.infinity, self.infinity)
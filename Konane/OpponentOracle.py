@@ -0,0 +1,62 @@
+## A fixed benchmark of puzzles with the opponent's answers, for grading many models against one opponent.
+## The puzzles are drawn with a seeded random number generator, so a run always grades against the same
+## set, and the opponent only has to search each puzzle once no matter how many models are graded.
+## The answers can be saved to a pickle file and are loaded from it instead of searched again.
+
+import cPickle
+import os
+import random
+
+class OpponentOracle:
+    def __init__(self, opponent, moveGenerator, numPuzzles = 500, seed = 0, fileName = None):
+        """
+        :param opponent: The player to get answers from. Only searched if there is no saved oracle.
+        :param moveGenerator: RandomStateGenerator to draw the puzzles from
+        :param numPuzzles: Number of puzzles to draw. Duplicates are skipped, so there may be fewer.
+        :param seed: Seed for drawing the puzzles
+        :param fileName: Pickle file to load the oracle from if it exists with the same seed and
+            number of puzzles, and to save it to otherwise.
+        """
+        self.numPuzzles = numPuzzles
+        self.seed = seed
+        self.puzzles = None # List of (board, side, opponent's move)
+        if fileName is not None and os.path.exists(fileName):
+            self.load(fileName)
+        if self.puzzles is None:
+            self.puzzles = self.askOpponent(opponent, self.drawPuzzles(moveGenerator))
+            if fileName is not None:
+                self.save(fileName)
+
+    def drawPuzzles(self, moveGenerator):
+        """
+        :return: The benchmark's (board, side) pairs, always the same for the same seed and corpus.
+        """
+        rand = random.Random(self.seed)
+        boards = []
+        sides = []
+        for count in range(self.numPuzzles):
+            side = rand.choice(["W", "B"])
+            board = moveGenerator.getRandom(side, rand)
+            if board not in boards: #Skip duplicates
+                boards.append(board)
+                sides.append(side)
+        return zip(boards, sides)
+
+    def askOpponent(self, opponent, puzzles):
+        """
+        :return: List of (board, side, move) with the opponent's move for every (board, side) puzzle
+        """
+        answered = []
+        for board, side in puzzles:
+            opponent.setSide(side)
+            answered.append((board, side, opponent.getMove(board)))
+        return answered
+
+    def load(self, fileName):
+        saved = cPickle.load(open(fileName, "rb"))
+        if saved["seed"] == self.seed and saved["numPuzzles"] == self.numPuzzles:
+            self.puzzles = saved["puzzles"]
+
+    def save(self, fileName):
+        saved = {"seed": self.seed, "numPuzzles": self.numPuzzles, "puzzles": self.puzzles}
+        cPickle.dump(saved, open(fileName, "wb+"), cPickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,67 @@
+## Runs model searches on a pool of worker processes.
+## A job is a picklable (weights, boardState, side, depth) tuple, where weights is a
+## StaticEvalModel.getWeightsKey() tuple, and its result is the move a MinimaxPlayer with those
+## weights makes for side on boardState. Searching is pure Python, so threads would just take
+## turns on the GIL; processes let every core search at once.
+
+import multiprocessing
+import johnMinimaxEvolved
+
+# One player per (board size, depth) in each worker process, reused between jobs
+_players = {}
+
+def getPlayer(size, depth):
+    player = _players.get((size, depth))
+    if player is None:
+        player = johnMinimaxEvolved.MinimaxPlayer(size, depth)
+        player.initialize("W")
+        _players[(size, depth)] = player
+    return player
+
+def evaluateJob(job):
+    """
+    Gets the move for one (weights, boardState, side, depth) job. Runs in the worker processes.
+    """
+    weights, state, side, depth = job
+    player = getPlayer(len(state), depth)
+    player.model.setWeights(weights)
+    player.setSide(side)
+    return player.getMove(state)
+
+class ParallelEvaluator:
+    def __init__(self, processes = None, chunksPerProcess = 4):
+        """
+        :param processes: Number of worker processes, defaults to the number of cores.
+        :param chunksPerProcess: Jobs are sent to the workers in about this many chunks per process.
+            More chunks balance the load better, fewer cost less in communication.
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        self.processes = processes
+        self.chunksPerProcess = chunksPerProcess
+        self.pool = multiprocessing.Pool(processes)
+
+    def getMoves(self, jobs):
+        """
+        Runs the jobs on the pool.
+        :param jobs: List of (weights, boardState, side, depth) tuples
+        :return: The list of moves, in the same order as jobs
+        """
+        if not jobs:
+            return []
+        chunkSize = max(1, len(jobs) / (self.processes * self.chunksPerProcess))
+        return self.pool.map(evaluateJob, jobs, chunkSize)
+
+    def getModelMoves(self, models, boardState, side, depth):
+        """
+        Gets the move of every model for one board.
+        :return: A list where the ith move is the move of models[i]
+        """
+        return self.getMoves([(model.getWeightsKey(), boardState, side, depth) for model in models])
+
+    def close(self):
+        """
+        Stops the worker processes once their current jobs are done.
+        """
+        self.pool.close()
+        self.pool.join()
@@ -0,0 +1,166 @@
+## Splits the search of one position across a pool of worker processes at the root.
+## Every root move is searched as its own job, so a deep search of a single board (an opponent answering
+## the puzzles of an OpponentOracle at depth 4 and up, say) uses every core instead of one.
+##
+## For MinimaxPlayers the jobs share the best value found so far through a multiprocessing.Value, and
+## each job searches its move with that value as its bound, like the serial search's alpha (or beta) at
+## the root. A job whose move can't beat the bound only learns that its value is at most (at least) the
+## bound. The pick is still deterministic and the same as the serial search's: the first move in
+## generateMoves order with the best value. Moves that only got a bound equal to the best value could
+## tie with it, so they are searched again with a zero width window before picking.
+##
+## gakonane.KOnane searches every root move with the full window anyway, so its moves are just mapped
+## over the pool and the best (value, move) is picked the same way KOnane.getMove does.
+##
+## Set a player's rootSearcher to a RootParallelSearcher to have its getMove use it.
+
+import multiprocessing
+import johnMinimaxEvolved
+import gakonane
+import TranspositionTable
+from johnMinimaxEvolved import nextAbove, nextBelow
+
+# The best root value so far of the running search, set by initWorker in each worker process
+_sharedBound = None
+# Players in each worker process, reused between jobs
+_players = {}
+
+def initWorker(sharedBound):
+    global _sharedBound
+    _sharedBound = sharedBound
+
+def getMinimaxPlayer(size, depth, symmetric):
+    player = _players.get(("minimax", size, depth, symmetric))
+    if player is None:
+        player = johnMinimaxEvolved.MinimaxPlayer(size, depth)
+        player.initialize("W")
+        player.setSymmetricHashing(symmetric)
+        _players[("minimax", size, depth, symmetric)] = player
+    return player
+
+def getKOnane(size, depth):
+    player = _players.get(("gakonane", size, depth))
+    if player is None:
+        player = gakonane.KOnane(size, depth)
+        _players[("gakonane", size, depth)] = player
+    return player
+
+def searchMinimaxRootMove(job):
+    """
+    Searches one root move of a MinimaxPlayer's search. Runs in the worker processes.
+    :param job: (weights, board, side, depth, (useInPlaceSearch, usePrincipalVariation, symmetric), move, window)
+        window is the (alpha, beta) to search the move with, or None to search it against the shared bound.
+    :return: The move's value if window was given, otherwise (value, exact, bound) where bound is the
+        shared bound the move was searched against. A value that isn't exact is a bound on the real value.
+    """
+    weights, board, side, depth, options, move, window = job
+    useInPlaceSearch, usePrincipalVariation, symmetric = options
+    player = getMinimaxPlayer(len(board), depth, symmetric)
+    player.model.setWeights(weights)
+    player.setSide(side)
+    player.useInPlaceSearch = useInPlaceSearch
+    player.usePrincipalVariation = usePrincipalVariation
+    if window is not None:
+        return player.searchRootMove(board, move, window[0], window[1])
+
+    infinity = player.infinity
+    maximizing = side == johnMinimaxEvolved.MinimaxNode.maximizer
+    bound = _sharedBound.value
+    if maximizing:
+        value = player.searchRootMove(board, move, bound, infinity)
+        exact = value > bound or bound <= -infinity
+    else:
+        value = player.searchRootMove(board, move, -infinity, bound)
+        exact = value < bound or bound >= infinity
+    if exact:
+        with _sharedBound.get_lock():
+            if (maximizing and value > _sharedBound.value) or (not maximizing and value < _sharedBound.value):
+                _sharedBound.value = value
+    return (value, exact, bound)
+
+def searchKOnaneRootMove(job):
+    """
+    Gets the value of one root move of a gakonane.KOnane search. Runs in the worker processes.
+    :param job: (board size, depth, side, board, move)
+    """
+    size, depth, side, board, move = job
+    player = getKOnane(size, depth)
+    player.initialize(side)
+    return player.minValue(player.nextBoard(board, side, move), depth - 1, -9999, 9999)
+
+class RootParallelSearcher:
+    def __init__(self, processes = None):
+        """
+        :param processes: Number of worker processes, defaults to the number of cores.
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        self.processes = processes
+        self.bound = multiprocessing.Value("d", 0.0)
+        self.pool = multiprocessing.Pool(processes, initWorker, (self.bound,))
+
+    def getMove(self, player, board):
+        """
+        Gets the move player would make on board, searching the root moves on the pool.
+        :param player: A johnMinimaxEvolved.MinimaxPlayer or gakonane.KOnane, with its side set
+        """
+        if isinstance(player, gakonane.KOnane):
+            return self.getKOnaneMove(player, board)
+        return self.getMinimaxMove(player, board)
+
+    def getMinimaxMove(self, player, board):
+        moves = player.generateMoves(board, player.side)
+        if len(moves) == 0:
+            player.bestMove = []
+            return []
+        if len(moves) == 1:
+            player.bestMove = moves[0]
+            return moves[0]
+        maximizing = player.side == johnMinimaxEvolved.MinimaxNode.maximizer
+        infinity = player.infinity
+        if maximizing:
+            self.bound.value = -infinity
+        else:
+            self.bound.value = infinity
+        options = (player.useInPlaceSearch, player.usePrincipalVariation,
+                   isinstance(player.hasher, TranspositionTable.SymmetricZobristHasher))
+        common = (player.model.getWeightsKey(), board, player.side, player.limit, options)
+        results = self.pool.map(searchMinimaxRootMove, [common + (move, None) for move in moves], 1)
+
+        # Some move always gets an exact value equal to the best: either it was searched before a better
+        # bound was known, or it failed against a bound that is itself the exact value of the best move.
+        exactValues = [value for value, exact, bound in results if exact]
+        if maximizing:
+            best = max(exactValues)
+        else:
+            best = min(exactValues)
+        first = [i for i, (value, exact, bound) in enumerate(results) if exact and value == best][0]
+        # An earlier move that only learnt it is no better than best might be equal to it, and would win the tie
+        ambiguous = [i for i in xrange(first) if not results[i][1] and results[i][2] == best]
+        if ambiguous:
+            if maximizing:
+                window = (nextBelow(best), infinity)
+            else:
+                window = (-infinity, nextAbove(best))
+            values = self.pool.map(searchMinimaxRootMove, [common + (moves[i], window) for i in ambiguous], 1)
+            for i, value in zip(ambiguous, values):
+                if (maximizing and value > window[0]) or (not maximizing and value < window[1]):
+                    first = i
+                    break
+        player.bestMove = moves[first]
+        return moves[first]
+
+    def getKOnaneMove(self, player, board):
+        moves = player.generateMoves(board, player.side)
+        if len(moves) == 0:
+            return []
+        values = self.pool.map(searchKOnaneRootMove,
+                               [(player.size, player.limit, player.side, board, move) for move in moves], 1)
+        return max(zip(values, moves))[1]
+
+    def close(self):
+        """
+        Stops the worker processes once their current jobs are done.
+        """
+        self.pool.close()
+        self.pool.join()
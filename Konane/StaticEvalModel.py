@@ -4,9 +4,17 @@
 
 import random
 import updatedKonane
+import FeatureCache
+import TranspositionTable
 from copy import copy
 
 class StaticEvalModel(updatedKonane.Konane):
+    # Shared by every model, maps (board hash, side) to the raw feature vector. Set to None to turn off.
+    featureCache = FeatureCache.FeatureCache()
+    # One Zobrist hasher per board size. They use the default seed, same as MinimaxPlayer's,
+    # so a hash the search already computed for a node gives the same key.
+    hashers = {}
+
     def __init__(self, size):
         self.CORRECTNESS_WEIGHT = 100.0
         self.DIVERSITY_WEIGHT = 0.0001
@@ -35,12 +43,52 @@ class StaticEvalModel(updatedKonane.Konane):
     #Return the weighted static evaluation of the given node
     #This is the sum of the weighted differences of each pair of features
     def staticEval(self, node):
-        return ((len(self.generateMoves(node.state, node.player)) * self.myMovesWeight) \
-                    - (len(self.generateMoves(node.state, self.opponent(node.player))) * self.theirMovesWeight)) \
-                    + ((self.countSymbol(node.state, node.player) * self.myPiecesWeight) \
-                    - (self.countSymbol(node.state, self.opponent(node.player)) * self.theirPiecesWeight)) \
-                    + ((self.countMovablePieces(node.state, node.player) * self.myMovableWeight ) \
-                    - (self.countMovablePieces(node.state, self.opponent(node.player)) * self.theirMovableWeight))
+        return self.evalFeatures(self.getFeatures(node))
+
+    def evalFeatures(self, features):
+        """
+        Weights raw features from getFeatures, so a caller that already has them doesn't look them up again.
+        """
+        myMoves, theirMoves, myPieces, theirPieces, myMovable, theirMovable = features
+        return ((myMoves * self.myMovesWeight) - (theirMoves * self.theirMovesWeight)) \
+                    + ((myPieces * self.myPiecesWeight) - (theirPieces * self.theirPiecesWeight)) \
+                    + ((myMovable * self.myMovableWeight) - (theirMovable * self.theirMovableWeight))
+
+    def getFeatures(self, node):
+        """
+        Gets the raw features of the node's board from node.player's point of view, in featuresNameList order.
+        Uses the shared featureCache when it is on. If the node carries a Zobrist hash
+        (node.hash, set by MinimaxPlayer's in-place search) it is used as the key instead of hashing again.
+        """
+        cache = self.featureCache
+        if cache is None:
+            return self.computeFeatures(node.state, node.player)
+        h = getattr(node, "hash", None)
+        if h is None:
+            if type(node.state) is tuple:
+                # Bitboards are hashable as they are
+                h = node.state
+            else:
+                h = self.getHasher().hashBoard(node.state, node.player)
+        key = (h, node.player)
+        features = cache.get(key)
+        if features is None:
+            features = self.computeFeatures(node.state, node.player)
+            cache.put(key, features)
+        return features
+
+    def computeFeatures(self, board, player):
+        """
+        Computes the raw features of board from player's point of view, in featuresNameList order.
+        """
+        return self.countFeatures(board, player)
+
+    def getHasher(self):
+        hasher = self.hashers.get(self.size)
+        if hasher is None:
+            hasher = TranspositionTable.ZobristHasher(self.size)
+            self.hashers[self.size] = hasher
+        return hasher
     
     # Returns weighted static evaluation of the given node.
     # Uses board evaluation function L from the Thompson paper.
@@ -74,6 +122,20 @@ class StaticEvalModel(updatedKonane.Konane):
                 setattr(self, featureName, getattr(self, featureName) +
                         random.uniform(-1.0 * (self.mutateAmount / 2.0), (self.mutateAmount / 2.00)))
 
+    def getWeightsKey(self):
+        """
+        :return: The model's weights as a tuple, in featuresNameList order. Two models with the same
+            weights evaluate every board the same, so this can key anything cached per model.
+        """
+        return tuple([getattr(self, featureName) for featureName in self.featuresNameList])
+
+    def setWeights(self, weights):
+        """
+        Sets the model's weights from a sequence in featuresNameList order, such as one from getWeightsKey.
+        """
+        for featureName, weight in zip(self.featuresNameList, weights):
+            setattr(self, featureName, weight)
+
     def dumpModel(self):
         """ Dumps out the model as a string in the format:
         %myMovesWeight, %theirMovesWeight, %myPiecesWeight, %theirPiecesWeight """
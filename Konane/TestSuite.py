@@ -3,7 +3,7 @@
 ## Date: 1/6/15
 __author__ = 'julian'
 
-import EEATest, randomBoardStates, johnMinimaxEvolved, Pie
+import EEATest, randomBoardStates, johnMinimaxEvolved, Pie, MultiModelSearch
 from python27Defs import *
 
 class TestSuite:
@@ -15,6 +15,13 @@ class TestSuite:
         self.moveGenerator = randomBoardStates.RandomStateGenerator(boardSize=size)
         self.disagreementReqToContinue = 0.5
         self.bestTest = []
+        # Set to a ParallelEvaluator to search models on worker processes
+        self.evaluator = None
+        # Searches each puzzle once for every model when NumPy is around
+        if MultiModelSearch.isAvailable():
+            self.batchSearcher = MultiModelSearch.MultiModelSearcher(size, dummyPlayer.limit)
+        else:
+            self.batchSearcher = None
 
     def evolve(self, models, testSetSize = 10):
         """
@@ -29,6 +36,12 @@ class TestSuite:
         by how much a particular test creates disagreement among the given set of models.
         """
         NUM_GENS_BEFORE_GIVING_UP = 100
+        # Responses of models that are no longer in the population will never be asked for again
+        currentKeys = set([(model.getWeightsKey(), self.dummyPlayer.limit) for model in models])
+        for puzzle in self.bestTest:
+            for key in puzzle.modelResponses.keys():
+                if key not in currentKeys:
+                    del puzzle.modelResponses[key]
         #1: Generate random set of tests
         testSet = []
         for i in range(testSetSize):
@@ -93,15 +106,9 @@ class TestSuite:
         So that's 3 / (2 * 5) = 0.3 disagreement.
         """
         disagreement = 0.0
-        results = [] #This will be a 2D list where every entry is a list of the models responses to each puzzle in the test
-                     #These are in order, so results[i][0] corresponds to results[j][0]
-        for model in models:
-            currModelResults = []
-            for puzzle in test.getTest():
-                self.dummyPlayer.model = model
-                result = puzzle.getResult(self.dummyPlayer)
-                currModelResults.append(result)
-            results.append(currModelResults)
+        #This will be a 2D list where every entry is a list of the models responses to each puzzle in the test
+        #These are in order, so results[i][0] corresponds to results[j][0]
+        results = self.getModelResponses(test.getTest(), models)
 
         # Computes the disagreement.
         # Disagreement is +1 for every time two of the models don't agree on what move to make.
@@ -119,6 +126,47 @@ class TestSuite:
 
         return disagreement
 
+    def getModelResponses(self, puzzles, models):
+        """
+        Gets every model's move for every puzzle. Moves are cached on the puzzles (puzzle.modelResponses),
+        and crossover and mutation keep most puzzles of a test, so only the puzzles (and models) that
+        haven't been seen together yet are searched.
+        :return: A 2D list where results[i][j] is the move of models[i] for puzzles[j]
+        """
+        depth = self.dummyPlayer.limit
+        keys = [(model.getWeightsKey(), depth) for model in models]
+        missing = [] # (puzzle, models not searched on it yet)
+        for puzzle in puzzles:
+            missingModels = []
+            missingKeys = set()
+            for key, model in zip(keys, models):
+                if key not in puzzle.modelResponses and key not in missingKeys:
+                    missingKeys.add(key)
+                    missingModels.append(model)
+            if missingModels:
+                missing.append((puzzle, missingModels))
+
+        if self.evaluator is not None and missing:
+            jobs = [(model.getWeightsKey(), puzzle.state, puzzle.side, depth)
+                    for puzzle, missingModels in missing for model in missingModels]
+            moves = iter(self.evaluator.getMoves(jobs))
+            for puzzle, missingModels in missing:
+                for model in missingModels:
+                    puzzle.modelResponses[(model.getWeightsKey(), depth)] = moves.next()
+        else:
+            for puzzle, missingModels in missing:
+                if self.batchSearcher is not None:
+                    moves = self.batchSearcher.getMoves(puzzle.state, puzzle.side, missingModels)
+                else:
+                    moves = []
+                    for model in missingModels:
+                        self.dummyPlayer.model = model
+                        moves.append(puzzle.getResult(self.dummyPlayer))
+                for model, move in zip(missingModels, moves):
+                    puzzle.modelResponses[(model.getWeightsKey(), depth)] = move
+
+        return [[puzzle.modelResponses[key] for puzzle in puzzles] for key in keys]
+
     def getBestTest(self):
         """
         :return: the test suite as a list of EEATests
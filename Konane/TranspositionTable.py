@@ -0,0 +1,184 @@
+## Zobrist hashing for Konane boards and a bounded transposition table for the minimax players.
+## Entries are keyed on the board hash together with a key for the static evaluator's weights,
+## so two StaticEvalModels can share one table without ever reading each other's values.
+## SymmetricZobristHasher gives every colour preserving symmetric copy of a board the same hash,
+## so the table (and the feature cache, which uses the same hashes) shares entries between them.
+
+import random
+import BoardSymmetry
+
+# Bound types for stored values
+EXACT = 0
+LOWER = 1 # The real value is at least the stored value
+UPPER = 2 # The real value is at most the stored value
+
+class ZobristHasher:
+    def __init__(self, size, seed = 20150106):
+        """
+        :param size: Board size the hasher is for
+        :param seed: Seed for the random keys. A private Random is used, so building a
+            hasher never changes the global random state that the EEA relies on.
+        """
+        self.size = size
+        rand = random.Random(seed)
+        self.keys = {}
+        for r in xrange(size):
+            for c in xrange(size):
+                self.keys[(r, c, 'B')] = rand.getrandbits(64)
+                self.keys[(r, c, 'W')] = rand.getrandbits(64)
+        self.whiteToMoveKey = rand.getrandbits(64)
+
+    def hashBoard(self, board, player):
+        """
+        Computes the hash of a list-of-lists board with the given player to move from scratch.
+        """
+        return self.hashWithKeys(self.keys, board, player)
+
+    def hashWithKeys(self, keys, board, player):
+        h = 0
+        for r, row in enumerate(board):
+            for c, val in enumerate(row):
+                if val != '.':
+                    h ^= keys[(r, c, val)]
+        if player == 'W':
+            h ^= self.whiteToMoveKey
+        return h
+
+    def hashAfterMove(self, h, player, move, jumped):
+        """
+        Updates the hash h for player making move, given the jumped squares returned by
+        Konane.applyMove. The side to move is switched as well.
+        """
+        return self.updateWithKeys(self.keys, h, player, move, jumped)
+
+    def updateWithKeys(self, keys, h, player, move, jumped):
+        h ^= keys[(move[0], move[1], player)] ^ self.whiteToMoveKey
+        if move[0] == move[2] and move[1] == move[3]:
+            return h
+        h ^= keys[(move[2], move[3], player)]
+        if jumped:
+            opponent = 'W' if player == 'B' else 'B'
+            for r, c in jumped:
+                h ^= keys[(r, c, opponent)]
+        return h
+
+    def toTableMove(self, h, move):
+        """
+        :return: move as it should be stored in a table entry for the position with hash h
+        """
+        return move
+
+    def fromTableMove(self, h, move):
+        """
+        :return: The move on the position with hash h that a stored table move stands for
+        """
+        return move
+
+class SymmetricHash(long):
+    """
+    A board hash that is the same for every colour preserving symmetric copy of the board: the smallest
+    of the copies' hashes. It also carries every copy's hash so it can be updated move by move, and the
+    symmetry that gave the smallest one.
+    """
+    pass
+
+class SymmetricZobristHasher(ZobristHasher):
+    def __init__(self, size, seed = 20150106):
+        """
+        Same keys as ZobristHasher with the same seed, the hash of a board is the smallest of the
+        ZobristHasher hashes of its colour preserving symmetric copies.
+        """
+        ZobristHasher.__init__(self, size, seed)
+        self.symmetry = BoardSymmetry.BoardSymmetry(size)
+        self.symmetries = self.symmetry.colourPreserving
+        # symmetricKeys[i] hashes a board as if it had been moved by symmetries[i]
+        self.symmetricKeys = []
+        for s in self.symmetries:
+            squares = self.symmetry.squares[s]
+            self.symmetricKeys.append(dict(((r, c, colour), self.keys[squares[r][c] + (colour,)])
+                                           for r in xrange(size) for c in xrange(size) for colour in "BW"))
+
+    def makeHash(self, hashes):
+        value = min(hashes)
+        h = SymmetricHash(value)
+        h.hashes = hashes
+        h.symmetry = self.symmetries[hashes.index(value)]
+        return h
+
+    def hashBoard(self, board, player):
+        return self.makeHash(tuple([self.hashWithKeys(keys, board, player) for keys in self.symmetricKeys]))
+
+    def hashAfterMove(self, h, player, move, jumped):
+        return self.makeHash(tuple([self.updateWithKeys(keys, copyHash, player, move, jumped)
+                                    for keys, copyHash in zip(self.symmetricKeys, h.hashes)]))
+
+    def toTableMove(self, h, move):
+        return self.symmetry.toCanonicalMove(move, h.symmetry)
+
+    def fromTableMove(self, h, move):
+        return self.symmetry.fromCanonicalMove(move, h.symmetry)
+
+class TranspositionTable:
+    def __init__(self, numEntries = 2**16, replacementPolicy = "depth"):
+        """
+        A fixed size table of search results, indexed by hash.
+        :param numEntries: Number of slots, the table never grows past this.
+        :param replacementPolicy: What to do when a different position maps to a full slot.
+            "depth" keeps whichever entry was searched deeper (ties go to the new entry),
+            "always" always overwrites with the new entry.
+        """
+        if replacementPolicy not in ("depth", "always"):
+            raise ValueError("replacementPolicy must be depth or always")
+        self.numEntries = numEntries
+        self.replacementPolicy = replacementPolicy
+        self.clear()
+
+    def clear(self):
+        """
+        Empties the table and resets the counters.
+        """
+        self.slots = [None] * self.numEntries
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def slotIndex(self, h, weightsKey):
+        return (h ^ hash(weightsKey)) % self.numEntries
+
+    def probe(self, h, weightsKey):
+        """
+        :return: The entry (key, depth, bound, value, bestMove) stored for the position and
+            weights, or None if there isn't one. Counts a hit or a miss.
+        """
+        entry = self.slots[self.slotIndex(h, weightsKey)]
+        if entry is not None and entry[0] == (h, weightsKey):
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, h, weightsKey, depth, bound, value, bestMove = None):
+        """
+        Stores a search result, subject to the replacement policy.
+        :param depth: The remaining depth the position was searched to
+        :param bound: EXACT, LOWER or UPPER
+        """
+        index = self.slotIndex(h, weightsKey)
+        key = (h, weightsKey)
+        old = self.slots[index]
+        if old is not None and old[0] != key:
+            if self.replacementPolicy == "depth" and old[1] > depth:
+                return
+            self.overwrites += 1
+        self.slots[index] = (key, depth, bound, value, bestMove)
+        self.stores += 1
+
+    def hitRate(self):
+        """
+        :return: The fraction of probes that found an entry.
+        """
+        probes = self.hits + self.misses
+        if probes == 0:
+            return 0.0
+        return float(self.hits) / probes
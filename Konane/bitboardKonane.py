@@ -0,0 +1,387 @@
+## A bitboard version of the Konane board engine from updatedKonane.
+## Each side is stored as one integer where bit (r * size + c) is set if that side has a piece at (r, c),
+## so a board is the tuple (blackBits, whiteBits). Tuples of ints are immutable and hashable, which means
+## nextBoard never has to copy anything and boards can be used as dictionary keys directly.
+##
+## The generateMoves/nextBoard/makeMove/countSymbol/countMovablePieces API matches updatedKonane.Konane,
+## including the order the moves are generated in, so searches pick exactly the same moves. Every method
+## also accepts the list-of-lists boards used everywhere else (the random state pickles, KonanePuzzles)
+## and converts them on the way in. To use it in place of the list engine, import it as updatedKonane:
+##     import bitboardKonane as updatedKonane
+
+import random
+import updatedKonane
+from updatedKonane import KonaneError, Player
+
+class Konane(updatedKonane.Konane):
+    """
+    Konane with the board stored as a (blackBits, whiteBits) tuple of integers.
+    Single jumps for every piece of a side are found at once with shifts and masks,
+    multiple jumps are then followed square by square from the pieces that can jump at all.
+    """
+    # Bitboards are immutable tuples, nextBoard is already copy free
+    inPlaceMoves = False
+    maskNames = ("numSquares", "fullMask", "canJumpLeftMask", "canJumpRightMask")
+
+    def __init__(self, n):
+        self.size = n
+        self.initMasks()
+        self.reset()
+
+    def initMasks(self):
+        """
+        Builds the masks used by move generation from self.size.
+        """
+        n = self.size
+        self.numSquares = n * n
+        self.fullMask = (1 << self.numSquares) - 1
+        # Masks of the squares a piece can jump left from (column >= 2) and right from (column <= n-3)
+        self.canJumpLeftMask = 0
+        self.canJumpRightMask = 0
+        for r in xrange(n):
+            for c in xrange(n):
+                if c >= 2:
+                    self.canJumpLeftMask |= 1 << (r * n + c)
+                if c <= n - 3:
+                    self.canJumpRightMask |= 1 << (r * n + c)
+
+    def __getattr__(self, name):
+        # Subclasses like StaticEvalModel only set self.size and never call Konane.__init__,
+        # so the masks get built the first time they are needed.
+        if name in self.maskNames and "size" in self.__dict__:
+            self.initMasks()
+            return self.__dict__[name]
+        raise AttributeError(name)
+
+    def reset(self):
+        """
+        Resets the starting board state. Black starts on every square where row + col is even.
+        """
+        black = 0
+        white = 0
+        for r in xrange(self.size):
+            for c in xrange(self.size):
+                if (r + c) % 2 == 0:
+                    black |= 1 << (r * self.size + c)
+                else:
+                    white |= 1 << (r * self.size + c)
+        self.board = (black, white)
+
+    def __str__(self):
+        result = "	"
+        for i in xrange(self.size):
+            result += str(i) + " "
+        result += "\n"
+        listBoard = self.toListBoard(self.board)
+        for i in xrange(self.size):
+            result += str(i) + " "
+            for j in xrange(self.size):
+                result += str(listBoard[i][j]) + " "
+            result += "\n"
+        return result
+
+    def toBitboard(self, board):
+        """
+        Converts a list-of-lists board into a (blackBits, whiteBits) tuple.
+        Boards that are already bitboards are returned unchanged.
+        """
+        if type(board) is tuple:
+            return board
+        black = 0
+        white = 0
+        bit = 1
+        for row in board:
+            for val in row:
+                if val == 'B':
+                    black |= bit
+                elif val == 'W':
+                    white |= bit
+                bit <<= 1
+        return (black, white)
+
+    def toListBoard(self, board):
+        """
+        Converts a (blackBits, whiteBits) tuple back into the list-of-lists board format.
+        """
+        black, white = self.toBitboard(board)
+        result = []
+        bit = 1
+        for r in xrange(self.size):
+            row = []
+            for c in xrange(self.size):
+                if black & bit:
+                    row.append('B')
+                elif white & bit:
+                    row.append('W')
+                else:
+                    row.append('.')
+                bit <<= 1
+            result.append(row)
+        return result
+
+    def sideBits(self, board, player):
+        """
+        Returns (playerBits, opponentBits, emptyBits) for the given bitboard and player.
+        """
+        black, white = board
+        if player == 'B':
+            return black, white, self.fullMask & ~(black | white)
+        return white, black, self.fullMask & ~(black | white)
+
+    def popCount(self, bits):
+        return bin(bits).count("1")
+
+    def contains(self, board, row, col, symbol):
+        """
+        Returns true if the given row and col represent a valid location on
+        the konane board and that location contains the given symbol.
+        """
+        if not (0 <= row < self.size and 0 <= col < self.size):
+            return False
+        black, white = self.toBitboard(board)
+        bit = 1 << (row * self.size + col)
+        if symbol == 'B':
+            return bool(black & bit)
+        elif symbol == 'W':
+            return bool(white & bit)
+        return not ((black | white) & bit)
+
+    def countSymbol(self, board, symbol):
+        """
+        Returns the number of instances of the symbol on the board.
+        """
+        black, white = self.toBitboard(board)
+        if symbol == 'B':
+            return self.popCount(black)
+        elif symbol == 'W':
+            return self.popCount(white)
+        return self.numSquares - self.popCount(black | white)
+
+    def nextBoard(self, board, player, move):
+        """
+        Given a move for a particular player from (r1,c1) to (r2,c2) this
+        returns the bitboard after the move. It will raise a KonaneError if
+        the move is invalid. The given board is never changed.
+        """
+        r1 = move[0]
+        c1 = move[1]
+        r2 = move[2]
+        c2 = move[3]
+        board = self.toBitboard(board)
+        if not (self.valid(r1, c1) and self.valid(r2, c2)):
+            raise KonaneError
+        mine, theirs, empty = self.sideBits(board, player)
+        n = self.size
+        if not mine & (1 << (r1 * n + c1)):
+            raise KonaneError
+        dist = self.distance(r1, c1, r2, c2)
+        if dist == 0:
+            if self.openingMove(board):
+                mine &= ~(1 << (r1 * n + c1))
+                if player == 'B':
+                    return (mine, theirs)
+                return (theirs, mine)
+            raise KonaneError
+        if not empty & (1 << (r2 * n + c2)):
+            raise KonaneError
+        jumps = dist/2
+        dr = (r2 - r1)/dist
+        dc = (c2 - c1)/dist
+        for i in xrange(jumps):
+            jumped = 1 << ((r1 + dr) * n + c1 + dc)
+            if not theirs & jumped:
+                raise KonaneError
+            theirs &= ~jumped
+            mine &= ~(1 << (r1 * n + c1))
+            r1 += 2*dr
+            c1 += 2*dc
+            mine |= 1 << (r1 * n + c1)
+        if player == 'B':
+            return (mine, theirs)
+        return (theirs, mine)
+
+    def openingMove(self, board):
+        black, white = self.toBitboard(board)
+        return self.numSquares - self.popCount(black | white) <= 1
+
+    def generateSecondMoves(self, board):
+        """
+        Returns the special cases for the second move of the game, based
+        on where the first move occurred.
+        """
+        black, white = self.toBitboard(board)
+        occupied = black | white
+        n = self.size
+        moves = []
+        if not occupied & 1:
+            moves.append([0,1]*2)
+            moves.append([1,0]*2)
+            return moves
+        elif not occupied & (1 << (self.numSquares - 1)):
+            moves.append([n-1,n-2]*2)
+            moves.append([n-2,n-1]*2)
+            return moves
+        elif not occupied & (1 << ((n/2 - 1) * n + n/2 - 1)):
+            pos = n/2 - 1
+        else:
+            pos = n/2
+        moves.append([pos,pos-1]*2)
+        moves.append([pos+1,pos]*2)
+        moves.append([pos,pos+1]*2)
+        moves.append([pos-1,pos]*2)
+        return moves
+
+    def singleJumps(self, mine, theirs, empty):
+        """
+        Returns the masks of the pieces in mine that can make at least one jump
+        to the left, up, right and down respectively.
+        """
+        n = self.size
+        left = mine & self.canJumpLeftMask & (theirs << 1) & (empty << 2)
+        up = mine & (theirs << n) & (empty << (2 * n))
+        right = mine & self.canJumpRightMask & (theirs >> 1) & (empty >> 2)
+        down = mine & (theirs >> n) & (empty >> (2 * n))
+        return left, up, right, down
+
+    def generateMoves(self, board, player):
+        """
+        Generates and returns all legal moves for the given player
+        using the current board configuration.
+        """
+        board = self.toBitboard(board)
+        if self.openingMove(board):
+            if player=='B':
+                return self.generateFirstMoves(board)
+            else:
+                return self.generateSecondMoves(board)
+        mine, theirs, empty = self.sideBits(board, player)
+        left, up, right, down = self.singleJumps(mine, theirs, empty)
+        n = self.size
+        moves = []
+        append = moves.append
+        starts = left | up | right | down
+        # Walk the pieces that can jump in row-major order, then left/up/right/down like updatedKonane.check
+        while starts:
+            low = starts & -starts
+            starts ^= low
+            square = low.bit_length() - 1
+            r, c = divmod(square, n)
+            for directionMask, rd, cd in ((left, 0, -1), (up, -1, 0), (right, 0, 1), (down, 1, 0)):
+                if not directionMask & low:
+                    continue
+                targetR = r + 2*rd
+                targetC = c + 2*cd
+                append([r, c, targetR, targetC])
+                # Follow multiple jumps in the same direction
+                while 0 <= targetR + 2*rd < n and 0 <= targetC + 2*cd < n \
+                        and theirs & (1 << ((targetR + rd) * n + targetC + cd)) \
+                        and empty & (1 << ((targetR + 2*rd) * n + targetC + 2*cd)):
+                    targetR += 2*rd
+                    targetC += 2*cd
+                    append([r, c, targetR, targetC])
+        return moves
+
+    def countMovablePieces(self, board, player):
+        """
+        Returns the number of the given player's pieces that have at least one legal jump.
+        """
+        board = self.toBitboard(board)
+        if self.openingMove(board):
+            if player=='B':
+                return len(self.generateFirstMoves(board))
+            else:
+                return len(self.generateSecondMoves(board))
+        left, up, right, down = self.singleJumps(*self.sideBits(board, player))
+        return self.popCount(left | up | right | down)
+
+    def countMoves(self, left, up, right, down, theirs, empty):
+        """
+        Returns the number of moves the pieces with the given single jumps (from singleJumps) have,
+        counting multiple jumps, without building the moves. Each step follows every jump in a direction
+        one more jump along from the squares the last jumps landed on.
+        """
+        n = self.size
+        count = 0
+        landed = left >> 2
+        while landed:
+            count += self.popCount(landed)
+            landed = (landed & self.canJumpLeftMask & (theirs << 1) & (empty << 2)) >> 2
+        landed = up >> (2 * n)
+        while landed:
+            count += self.popCount(landed)
+            landed = (landed & (theirs << n) & (empty << (2 * n))) >> (2 * n)
+        landed = right << 2
+        while landed:
+            count += self.popCount(landed)
+            landed = (landed & self.canJumpRightMask & (theirs >> 1) & (empty >> 2)) << 2
+        landed = down << (2 * n)
+        while landed:
+            count += self.popCount(landed)
+            landed = (landed & (theirs >> n) & (empty >> (2 * n))) << (2 * n)
+        return count
+
+    def countFeatures(self, board, player):
+        """
+        Counts the moves, pieces and movable pieces of both sides, the same numbers as
+        updatedKonane.Konane.countFeatures, with one set of jump masks per side.
+        """
+        board = self.toBitboard(board)
+        if self.openingMove(board):
+            return updatedKonane.Konane.countFeatures(self, self.toListBoard(board), player)
+        mine, theirs, empty = self.sideBits(board, player)
+        myLeft, myUp, myRight, myDown = self.singleJumps(mine, theirs, empty)
+        theirLeft, theirUp, theirRight, theirDown = self.singleJumps(theirs, mine, empty)
+        return (self.countMoves(myLeft, myUp, myRight, myDown, theirs, empty),
+                self.countMoves(theirLeft, theirUp, theirRight, theirDown, mine, empty),
+                self.popCount(mine), self.popCount(theirs),
+                self.popCount(myLeft | myUp | myRight | myDown), self.popCount(theirLeft | theirUp | theirRight | theirDown))
+
+
+class SimplePlayer(Konane, Player):
+    """
+    Always chooses the first move from the set of possible moves.
+    """
+    def __init__(self, boardSize):
+        Konane.__init__(self, boardSize)
+        Player.__init__(self)
+    def initialize(self, side):
+        self.side = side
+        self.name = "Simple"
+    def getMove(self, board):
+        moves = self.generateMoves(board, self.side)
+        n = len(moves)
+        if n == 0:
+            return []
+        else:
+            return moves[0]
+
+class RandomPlayer(Konane, Player):
+    """
+    Chooses a random move from the set of possible moves.
+    """
+    def __init__(self, boardSize):
+        Konane.__init__(self, boardSize)
+        Player.__init__(self)
+    def initialize(self, side):
+        self.side = side
+        self.name = "Random"
+    def getMove(self, board):
+        moves = self.generateMoves(board, self.side)
+        n = len(moves)
+        if n == 0:
+            return []
+        else:
+            return moves[random.randrange(0, n)]
+
+class HumanPlayer(Konane, updatedKonane.HumanPlayer):
+    """
+    Prompts a human player for a move, showing the bitboard as rows.
+    """
+    def __init__(self, boardSize):
+        Konane.__init__(self, boardSize)
+        Player.__init__(self)
+    def getMove(self, board):
+        return updatedKonane.HumanPlayer.getMove(self, self.toListBoard(board))
+
+if __name__ == '__main__':
+    Konane(6).playNGames(10, RandomPlayer(6), SimplePlayer(6), False)
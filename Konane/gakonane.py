@@ -4,6 +4,7 @@
 
 import random
 import copy
+import MoveOrdering
 
 class KonaneError(AttributeError):
     """
@@ -518,9 +519,14 @@ class KOnane(Konane, Player):
     """
     Chooses moves based on a hyper-heuristic generated strategy
     """
+    moveOrderer = None
+    rootSearcher = None # A RootParallelSearch.RootParallelSearcher to search the root moves on worker processes
+
     def __init__(self, size, depthlimit):
         Konane.__init__(self, size)
         self.limit = depthlimit
+        # Orders the moves below the root and counts cutoffs, set to None to search in generateMoves order
+        self.moveOrderer = MoveOrdering.MoveOrderer()
 
     def initialize(self, side):
         self.side = side
@@ -530,6 +536,8 @@ class KOnane(Konane, Player):
         return (0.174 * self.myMoves(board)) + (-0.437 * self.opponentMoves(board)) + 0.1807 
 
     def getMove(self, board):
+        if self.rootSearcher is not None:
+            return self.rootSearcher.getMove(self, board)
         moves = self.generateMoves(board, self.side)
         if len(moves)==0:
             return []
@@ -544,9 +552,14 @@ class KOnane(Konane, Player):
             return []
         if (depth == 0):
             return self.heuristic(board)
-        for move in moves:
+        orderer = self.moveOrderer
+        if orderer is not None:
+            moves = orderer.orderMoves(moves, self.limit - depth, self.side)
+        for index, move in enumerate(moves):
             v = max(v, self.minValue(self.nextBoard(board, self.side, move), depth-1, alpha, beta))
             if v >= beta:
+                if orderer is not None:
+                    orderer.recordCutoff(move, self.limit - depth, self.side, depth, index, len(moves))
                 return v
             alpha = max(alpha, v)
         return v
@@ -558,9 +571,14 @@ class KOnane(Konane, Player):
             return []
         if (depth == 0):
             return self.heuristic(board)
-        for move in moves:
+        orderer = self.moveOrderer
+        if orderer is not None:
+            moves = orderer.orderMoves(moves, self.limit - depth, self.opponent(self.side))
+        for index, move in enumerate(moves):
             v = min(v, self.maxValue(self.nextBoard(board, self.opponent(self.side), move), depth-1, alpha, beta))
             if v <= alpha:
+                if orderer is not None:
+                    orderer.recordCutoff(move, self.limit - depth, self.opponent(self.side), depth, index, len(moves))
                 return v
             beta = min(beta, v)
         return v
@@ -1,5 +1,37 @@
+import struct
+import time
 import updatedKonane
 import StaticEvalModel
+import TranspositionTable
+import MoveOrdering
+from TranspositionTable import EXACT, LOWER, UPPER
+
+def nextAbove(value):
+    """
+    :return: The smallest float greater than value. Evaluations are floats, so (value, nextAbove(value))
+        is a zero width window: a search with it only tells whether the real value is greater than value.
+    """
+    value = float(value)
+    if value == 0.0:
+        return 5e-324
+    bits = struct.unpack("<q", struct.pack("<d", value))[0]
+    if value > 0.0:
+        bits += 1
+    else:
+        bits -= 1
+    return struct.unpack("<d", struct.pack("<q", bits))[0]
+
+def nextBelow(value):
+    """
+    :return: The largest float less than value.
+    """
+    return -nextAbove(-value)
+
+class SearchTimeout(Exception):
+    """
+    Raised inside a search when MinimaxPlayer's deadline passes, to abandon the current iteration.
+    """
+    pass
 
 class MinimaxNode:
     """
@@ -36,6 +68,10 @@ class MinimaxPlayer(updatedKonane.Konane, updatedKonane.Player):
     infinity = 5000
     limit = 0
     bestMove = None
+    deadline = None # time.time() the running search has to stop by, None for no deadline
+    moveOrderer = None
+    rootSearcher = None
+    checkInterval = 16 # Nodes searched between looks at the clock when there is a deadline
 
     def __init__(self, size, depthLimit):
         updatedKonane.Konane.__init__(self, size)
@@ -44,44 +80,173 @@ class MinimaxPlayer(updatedKonane.Konane, updatedKonane.Player):
         self.model = StaticEvalModel.StaticEvalModel(size)
         self.gamesPlayed = 0
         self.gamesWon = 0
+        # Search by making and unmaking moves on one board instead of copying a board per child
+        self.useInPlaceSearch = True
+        # Used by the in-place search, set transpositionTable to None to turn it off.
+        # A SymmetricZobristHasher shares entries between symmetric positions, see setSymmetricHashing.
+        self.hasher = TranspositionTable.ZobristHasher(size)
+        self.transpositionTable = TranspositionTable.TranspositionTable()
+        self.weightsKey = None
+        # Orders the moves of interior nodes and counts cutoffs, set to None to search in generateMoves order
+        self.moveOrderer = MoveOrdering.MoveOrderer()
+        # Principal variation search: every move after the first is searched with a zero width window first,
+        # and only searched again with the full window if it turns out better. Gives the same moves.
+        self.usePrincipalVariation = False
+        # Half width of the window the principal variation search starts each iteration of iterative
+        # deepening with, around the previous iteration's value. None to always use the full window.
+        self.aspirationWindow = 2.0
+        self.rootValue = None # Value of the root in the last search
+        # A RootParallelSearcher to search the root moves on worker processes, None to search here.
+        # Only used for fixed depth searches, iterative deepening (timeLimit) always searches here.
+        self.rootSearcher = None
+        # Milliseconds per move. When set, getMove deepens one ply at a time up to self.limit until the time is up.
+        self.timeLimit = None
+        self.completedDepth = 0 # Depth of the last search that getMove finished
 
     def initialize(self, side):
         self.side = side
         self.name = "MinimaxDepth" + str(self.limit)
 
+    def setSymmetricHashing(self, symmetric):
+        """
+        Turns sharing transposition table and feature cache entries between symmetric positions on or off.
+        """
+        if symmetric:
+            self.hasher = TranspositionTable.SymmetricZobristHasher(self.size)
+        else:
+            self.hasher = TranspositionTable.ZobristHasher(self.size)
+
     def getMove(self, board):
+        if self.timeLimit is not None:
+            return self.getMoveIterative(board, self.timeLimit)
+        self.completedDepth = self.limit
+        if self.rootSearcher is not None:
+            return self.rootSearcher.getMove(self, board)
+        return self.search(board)
+
+    def getMoveIterative(self, board, timeLimit):
+        """
+        Searches to depth 1, 2, ... up to self.limit until timeLimit milliseconds have passed.
+        The depth 1 search always finishes, deeper ones are abandoned when the time runs out.
+        :return: The best move of the deepest search that finished
+        """
+        deadline = time.time() + timeLimit / 1000.0
+        limit = self.limit
+        bestMove = None
+        bestValue = None
+        try:
+            for depth in xrange(1, limit + 1):
+                self.limit = depth
+                if depth > 1 and self.usePrincipalVariation and self.aspirationWindow is not None \
+                        and bestValue is not None and abs(bestValue) < self.infinity:
+                    # Aspiration window around the last iteration's value. When the value falls outside it
+                    # the window's result is only a bound, so search again with the full window.
+                    low = bestValue - self.aspirationWindow
+                    high = bestValue + self.aspirationWindow
+                    move = self.search(board, low, high)
+                    if not low < self.rootValue < high:
+                        move = self.search(board)
+                else:
+                    move = self.search(board)
+                # Only a finished iteration replaces the move, a timeout above keeps the last one
+                bestMove = move
+                bestValue = self.rootValue
+                self.completedDepth = depth
+                if time.time() >= deadline:
+                    break
+                self.deadline = deadline
+                self.nodesUntilCheck = self.checkInterval
+        except SearchTimeout:
+            pass
+        finally:
+            self.limit = limit
+            self.deadline = None
+        self.bestMove = bestMove
+        self.rootValue = bestValue
+        return bestMove
+
+    def checkDeadline(self):
+        """
+        Raises SearchTimeout if the deadline has passed. Only reads the clock every checkInterval calls.
+        """
+        self.nodesUntilCheck -= 1
+        if self.nodesUntilCheck <= 0:
+            self.nodesUntilCheck = self.checkInterval
+            if time.time() >= self.deadline:
+                raise SearchTimeout()
+
+    def search(self, board, alpha = None, beta = None):
+        """
+        Searches board to self.limit for self.side and returns the best move. The root's value is left in
+        self.rootValue, it is exact if it is strictly between alpha and beta and a bound otherwise.
+        :param alpha: Lower end of the root's window, -infinity if not given
+        :param beta: Upper end of the root's window, infinity if not given
+        """
+        if alpha is None:
+            alpha = -self.infinity
+        if beta is None:
+            beta = self.infinity
+        if self.useInPlaceSearch and self.inPlaceMoves:
+            # Copy the root once so the caller's board is safe, the search then only changes this copy
+            initialNode = MinimaxNode(self.boardCopy(board), None, 0, self.side)
+            if self.transpositionTable is not None:
+                initialNode.hash = self.hasher.hashBoard(board, self.side)
+                self.weightsKey = self.model.getWeightsKey()
+            self.rootValue = self.alphaBetaInPlace(initialNode, alpha, beta)
+            return self.bestMove
         initialNode = MinimaxNode(board, None, 0, self.side)
         #self.boundedMinimax(initialNode)
-        self.alphaBeta(initialNode, -self.infinity, self.infinity)
+        self.rootValue = self.alphaBeta(initialNode, alpha, beta)
         #print "BEST MOVE:", self.bestMove
         return self.bestMove
 
+    def searchRootMove(self, board, move, alpha, beta):
+        """
+        Searches the position after self.side makes move on board the way search searches that child of the root.
+        :return: The child's value, exact if it is strictly between alpha and beta and a bound otherwise
+        """
+        nextPlayer = self.opponent(self.side)
+        if self.useInPlaceSearch and self.inPlaceMoves:
+            state = self.boardCopy(board)
+            self.applyMove(state, self.side, move)
+            node = MinimaxNode(state, move, 1, nextPlayer)
+            if self.transpositionTable is not None:
+                node.hash = self.hasher.hashBoard(state, nextPlayer)
+                self.weightsKey = self.model.getWeightsKey()
+            return self.alphaBetaInPlace(node, alpha, beta)
+        return self.alphaBeta(MinimaxNode(self.nextBoard(board, self.side, move), move, 1, nextPlayer), alpha, beta)
+
     def eval(self, node):
         """
         Given a search node, returns an estimate of the value of its
         associated state.
         """
-        maxMoves = len(self.generateMoves(node.state, node.maximizer))
-        if maxMoves == 0 and node.player == node.maximizer:
-            return -self.infinity
-        minMoves = len(self.generateMoves(node.state, node.minimizer))
-        if minMoves == 0 and node.player == node.minimizer:
+        # One pass over the board gives both the terminal check and the features staticEval weights
+        features = self.model.getFeatures(node)
+        if features[0] == 0:
+            # The side to move has no moves and loses
+            if node.player == node.maximizer:
+                return -self.infinity
             return self.infinity
-        return self.model.staticEval(node)
+        return self.model.evalFeatures(features)
 
-    def successors(self, node):
-        result = []
-        moves = self.generateMoves(node.state, node.player)
+    def successors(self, node, moves=None):
+        """
+        Generator over the child nodes of node. Each child's board is only built when
+        the search asks for it, so children after a cutoff are never created.
+        :param moves: The legal moves of node, if the caller already generated them.
+        """
+        if moves is None:
+            moves = self.generateMoves(node.state, node.player)
+        nextPlayer = self.opponent(node.player)
         for move in moves:
             try:
                 nextState = self.nextBoard(node.state, node.player, move)
             except updatedKonane.KonaneError:
                 print("Hit a konane error!")
                 print("State: " + node.prettyBoard() + "\nPlayer: " + str(node.player) + "\nMove: " + str(move))
-            nextNode = MinimaxNode(nextState, move, node.depth+1,
-                                   self.opponent(node.player))
-            result.append(nextNode)
-        return result
+                continue
+            yield MinimaxNode(nextState, move, node.depth+1, nextPlayer)
 
     def boundedMinimax(self, node):
         """
@@ -92,7 +257,7 @@ class MinimaxPlayer(updatedKonane.Konane, updatedKonane.Player):
         # check for depth limit
         if node.depth == self.limit:
             return self.eval(node)
-        children = self.successors(node)
+        children = list(self.successors(node))
         # check for leaf
         if len(children) == 0:
             if node.depth == 0:
@@ -135,39 +300,175 @@ class MinimaxPlayer(updatedKonane.Konane, updatedKonane.Player):
         initialized to infinity.
         """
         #print node
+        if self.deadline is not None:
+            self.checkDeadline()
         if node.depth == self.limit:
             return self.eval(node)
-        children = self.successors(node)
-        if len(children) == 0:
+        moves = self.generateMoves(node.state, node.player)
+        if len(moves) == 0:
             if node.depth == 0:
                 self.bestMove = []
             return self.eval(node)
         if node.depth == 0:
-            self.bestMove = children[0].operator
-            if len(children) == 1:
+            self.bestMove = moves[0]
+            if len(moves) == 1:
                 #print "only one option"
                 return None
+        # The root keeps generateMoves order, so ties between root moves go the same way with or without ordering
+        orderer = self.moveOrderer
+        if node.depth == 0:
+            orderer = None
+        if orderer is not None:
+            moves = orderer.orderMoves(moves, node.depth, node.player)
+        # Children are built lazily, a cutoff stops before the remaining siblings are created
         if node.maximizing():
-            for i in range(len(children)):
-                result = self.alphaBeta(children[i], alpha, beta)
+            for index, child in enumerate(self.successors(node, moves)):
+                if index > 0 and self.usePrincipalVariation:
+                    result = self.alphaBeta(child, alpha, nextAbove(alpha))
+                    if alpha < result < beta:
+                        result = self.alphaBeta(child, alpha, beta)
+                else:
+                    result = self.alphaBeta(child, alpha, beta)
                 if result > alpha:
                     alpha = result
-                    if node.depth == 0: self.bestMove = children[i].operator
+                    if node.depth == 0: self.bestMove = child.operator
                 if alpha >= beta:
-                    #print "Braches cut off:", len(children)-i 
+                    if orderer is not None:
+                        orderer.recordCutoff(child.operator, node.depth, node.player, self.limit - node.depth,
+                                             index, len(moves))
                     return alpha
             return alpha
         else:
-            for i in range(len(children)):
-                result = self.alphaBeta(children[i], alpha, beta)
+            for index, child in enumerate(self.successors(node, moves)):
+                if index > 0 and self.usePrincipalVariation:
+                    result = self.alphaBeta(child, nextBelow(beta), beta)
+                    if alpha < result < beta:
+                        result = self.alphaBeta(child, alpha, beta)
+                else:
+                    result = self.alphaBeta(child, alpha, beta)
                 if result < beta:
                     beta = result
-                    if node.depth == 0: self.bestMove = children[i].operator
+                    if node.depth == 0: self.bestMove = child.operator
                 if beta <= alpha:
-                    #print "Branches cut off:", len(children)-i
+                    if orderer is not None:
+                        orderer.recordCutoff(child.operator, node.depth, node.player, self.limit - node.depth,
+                                             index, len(moves))
                     return beta
             return beta
 
+    def alphaBetaInPlace(self, node, alpha, beta):
+        """
+        The same search as alphaBeta, but it walks the tree with a single node whose
+        state is changed by applyMove and restored by undoMove, so no boards or nodes
+        are allocated for children. node.depth and node.player are put back before returning.
+        If self.transpositionTable is set, node.hash must hold the Zobrist hash of the node.
+        Table entries are only used at the same remaining depth, so the search returns
+        exactly what it would without the table.
+        """
+        if self.deadline is not None:
+            self.checkDeadline()
+        table = self.transpositionTable
+        root = node.depth == 0
+        remaining = self.limit - node.depth
+        tableMove = None
+        if table is not None and not root:
+            entry = table.probe(node.hash, self.weightsKey)
+            if entry is not None:
+                if entry[1] == remaining:
+                    bound = entry[2]
+                    value = entry[3]
+                    if bound == EXACT or (bound == LOWER and value >= beta) or (bound == UPPER and value <= alpha):
+                        return value
+                # Searched to another depth or with another window, its best move is still a good first guess
+                if entry[4] is not None:
+                    tableMove = self.hasher.fromTableMove(node.hash, entry[4])
+        if remaining == 0:
+            value = self.eval(node)
+            if table is not None:
+                table.store(node.hash, self.weightsKey, 0, EXACT, value)
+            return value
+        board = node.state
+        player = node.player
+        moves = self.generateMoves(board, player)
+        if len(moves) == 0:
+            if root:
+                self.bestMove = []
+            value = self.eval(node)
+            if table is not None and not root:
+                table.store(node.hash, self.weightsKey, remaining, EXACT, value)
+            return value
+        if root:
+            self.bestMove = moves[0]
+            if len(moves) == 1:
+                return None
+        orderer = self.moveOrderer
+        if root:
+            orderer = None
+        if orderer is not None:
+            moves = orderer.orderMoves(moves, node.depth, player, tableMove)
+        maximizing = node.maximizing()
+        alphaOrig = alpha
+        betaOrig = beta
+        bestMove = None
+        h = getattr(node, "hash", None)
+        node.depth += 1
+        node.player = self.opponent(player)
+        value = None
+        for index, move in enumerate(moves):
+            jumped = self.applyMove(board, player, move)
+            if table is not None:
+                node.hash = self.hasher.hashAfterMove(h, player, move, jumped)
+            if index > 0 and self.usePrincipalVariation:
+                # Scout with a zero width window, only a move that beats the best so far is searched again
+                if maximizing:
+                    result = self.alphaBetaInPlace(node, alpha, nextAbove(alpha))
+                else:
+                    result = self.alphaBetaInPlace(node, nextBelow(beta), beta)
+                if alpha < result < beta:
+                    result = self.alphaBetaInPlace(node, alpha, beta)
+            else:
+                result = self.alphaBetaInPlace(node, alpha, beta)
+            self.undoMove(board, player, move, jumped)
+            if maximizing:
+                if result > alpha:
+                    alpha = result
+                    bestMove = move
+                    if root: self.bestMove = move
+                if alpha >= beta:
+                    value = alpha
+                    if orderer is not None:
+                        orderer.recordCutoff(move, node.depth - 1, player, remaining, index, len(moves))
+                    break
+            else:
+                if result < beta:
+                    beta = result
+                    bestMove = move
+                    if root: self.bestMove = move
+                if beta <= alpha:
+                    value = beta
+                    if orderer is not None:
+                        orderer.recordCutoff(move, node.depth - 1, player, remaining, index, len(moves))
+                    break
+        node.depth -= 1
+        node.player = player
+        node.hash = h
+        if value is None:
+            if maximizing:
+                value = alpha
+            else:
+                value = beta
+        if table is not None and not root:
+            if value <= alphaOrig:
+                bound = UPPER
+            elif value >= betaOrig:
+                bound = LOWER
+            else:
+                bound = EXACT
+            if bestMove is not None:
+                bestMove = self.hasher.toTableMove(h, bestMove)
+            table.store(h, self.weightsKey, remaining, bound, value, bestMove)
+        return value
+
 if __name__ == '__main__':
     game = updatedKonane.Konane(6)
     game.playNGames(50, MinimaxPlayer(8,2), updatedKonane.RandomPlayer(8))
@@ -1,4 +1,5 @@
 from konane import *
+import MoveOrdering
 
 class MinimaxNode:
     """
@@ -29,11 +30,14 @@ class MinimaxPlayer(Konane, Player):
     infinity = 5000
     limit = 0
     bestMove = None
+    moveOrderer = None
 
     def __init__(self, size, depthLimit):
         Konane.__init__(self, size)
         Player.__init__(self)
         self.limit = depthLimit
+        # Orders the moves of interior nodes and counts cutoffs, set to None to search in generateMoves order
+        self.moveOrderer = MoveOrdering.MoveOrderer()
 
     def initialize(self, side):
         self.side = side
@@ -59,14 +63,18 @@ class MinimaxPlayer(Konane, Player):
             return self.infinity
         return maxMoves - minMoves
 
-    def successors(self, node):
-        result = []
-        for move in self.generateMoves(node.state, node.player):
+    def successors(self, node, moves=None):
+        """
+        Generator over the child nodes of node. Each child's board is only built when
+        the search asks for it, so children after a cutoff are never created.
+        :param moves: The legal moves of node, if the caller already generated them.
+        """
+        if moves is None:
+            moves = self.generateMoves(node.state, node.player)
+        nextPlayer = self.opponent(node.player)
+        for move in moves:
             nextState = self.nextBoard(node.state, node.player, move)
-            nextNode = MinimaxNode(nextState, move, node.depth+1,
-                                   self.opponent(node.player))
-            result.append(nextNode)
-        return result
+            yield MinimaxNode(nextState, move, node.depth+1, nextPlayer)
 
     def boundedMinimax(self, node):
         """
@@ -77,7 +85,7 @@ class MinimaxPlayer(Konane, Player):
         # check for depth limit
         if node.depth == self.limit:
             return self.eval(node)
-        children = self.successors(node)
+        children = list(self.successors(node))
         # check for leaf
         if len(children) == 0:
             if node.depth == 0:
@@ -122,34 +130,45 @@ class MinimaxPlayer(Konane, Player):
         #print node
         if node.depth == self.limit:
             return self.eval(node)
-        children = self.successors(node)
-        if len(children) == 0:
+        moves = self.generateMoves(node.state, node.player)
+        if len(moves) == 0:
             if node.depth == 0:
                 self.bestMove = []
             return self.eval(node)
         if node.depth == 0:
-            self.bestMove = children[0].operator
-            if len(children) == 1:
+            self.bestMove = moves[0]
+            if len(moves) == 1:
                 #print "only one option"
                 return None
+        # The root keeps generateMoves order, so ties between root moves go the same way with or without ordering
+        orderer = self.moveOrderer
+        if node.depth == 0:
+            orderer = None
+        if orderer is not None:
+            moves = orderer.orderMoves(moves, node.depth, node.player)
+        # Children are built lazily, a cutoff stops before the remaining siblings are created
         if node.maximizing():
-            for i in range(len(children)):
-                result = self.alphaBeta(children[i], alpha, beta)
+            for index, child in enumerate(self.successors(node, moves)):
+                result = self.alphaBeta(child, alpha, beta)
                 if result > alpha:
                     alpha = result
-                    if node.depth == 0: self.bestMove = children[i].operator
+                    if node.depth == 0: self.bestMove = child.operator
                 if alpha >= beta:
-                    #print "Braches cut off:", len(children)-i 
+                    if orderer is not None:
+                        orderer.recordCutoff(child.operator, node.depth, node.player, self.limit - node.depth,
+                                             index, len(moves))
                     return alpha
             return alpha
         else:
-            for i in range(len(children)):
-                result = self.alphaBeta(children[i], alpha, beta)
+            for index, child in enumerate(self.successors(node, moves)):
+                result = self.alphaBeta(child, alpha, beta)
                 if result < beta:
                     beta = result
-                    if node.depth == 0: self.bestMove = children[i].operator
+                    if node.depth == 0: self.bestMove = child.operator
                 if beta <= alpha:
-                    #print "Branches cut off:", len(children)-i
+                    if orderer is not None:
+                        orderer.recordCutoff(child.operator, node.depth, node.player, self.limit - node.depth,
+                                             index, len(moves))
                     return beta
             return beta
 
@@ -1,91 +1,152 @@
 ## This is a file for generating and then retrieving random legal board states
 ## The generation can take as long as wanted, and will store to
-## "radomStates<board size>.p" which is a pickle file 
-## containing a list of the states.
+## "randomStates<side><board size>.bin" which is a BoardStateStore
+## holding the states packed as bitboards. Older corpora saved as
+## "randomStates<side><board size>.p" pickle files are converted the
+## first time they are opened.
 
 ## Author: Julian Jocque
 ## Date: 10/30/14 (spooky!)
 
 import updatedKonane as konane
+import bitboardKonane
 import cPickle
+import multiprocessing
+import os
 import random
+import BoardStateStore
+
+# Metadata filters for the states cleanUp keeps: more than one move, and past the opening moves
+def isInformativeWhite(metadata):
+    return metadata[BoardStateStore.WHITE_MOVES] > 1 and metadata[BoardStateStore.EMPTY_SQUARES] > 1
+
+def isInformativeBlack(metadata):
+    return metadata[BoardStateStore.BLACK_MOVES] > 1 and metadata[BoardStateStore.EMPTY_SQUARES] > 1
+
+def playRandomGames(task):
+    """
+    Plays random games in a worker process, the same way genRandom does, and collects the states seen.
+    :param task: (board size, number of plies to play, seed for the players)
+    :return: (white records, black records), the distinct states packed as BoardStateStore records
+    """
+    boardSize, numPlies, seed = task
+    random.seed(seed) # The players draw from the random module
+    player1 = bitboardKonane.RandomPlayer(boardSize)
+    player1.initialize("W")
+    player2 = bitboardKonane.RandomPlayer(boardSize)
+    player2.initialize("B")
+    game = bitboardKonane.Konane(boardSize)
+    whiteStates = set()
+    blackStates = set()
+    player1Turn = True
+    count = 0
+    while count < numPlies:
+        if player1Turn:
+            whiteStates.add(game.board)
+            player = player1
+        else:
+            blackStates.add(game.board)
+            player = player2
+        move = player.getMove(game.board)
+        if move == []:
+            #The player to move loses, start a new game
+            game.reset()
+            player1Turn = True
+            continue
+        game.makeMove(player.side, move)
+        player1Turn = not player1Turn
+        count += 1
+    return ([BoardStateStore.encode(game, board) for board in whiteStates],
+            [BoardStateStore.encode(game, board) for board in blackStates])
 
 class RandomStateGenerator:
 
-    def __init__(self, fileName="randomStates", boardSize = 8):
+    def __init__(self, fileName="randomStates", boardSize = 8, canonical = False):
+        """
+        :param canonical: Whether generating skips states that are symmetric copies of stored states
+        """
         self.boardSize = boardSize
-        self.blackStatesFilename = fileName + "black" + str(self.boardSize) + ".p"
-        self.whiteStatesFilename = fileName + "white" + str(self.boardSize) + ".p"
-        try:
-            self.blackStates = cPickle.load(open(self.blackStatesFilename, "rb"))
-            self.whiteStates = cPickle.load(open(self.whiteStatesFilename, "rb"))
-        except (EOFError, IOError):
-            self.blackStates = []
-            self.whiteStates = []
+        self.canonical = canonical
+        self.blackStatesFilename = fileName + "black" + str(self.boardSize) + ".bin"
+        self.whiteStatesFilename = fileName + "white" + str(self.boardSize) + ".bin"
+        self.blackStates = self.openStates(self.blackStatesFilename, fileName + "black" + str(self.boardSize) + ".p")
+        self.moveFilters = {}
+        self.whiteStates = self.openStates(self.whiteStatesFilename, fileName + "white" + str(self.boardSize) + ".p")
+
+    def openStates(self, storeFilename, pickleFilename):
+        """
+        Opens the memory mapped store of states, converting the old pickle file to one if there is no store yet.
+        :return: BoardStateStore of the states
+        """
+        if not os.path.exists(storeFilename) and os.path.exists(pickleFilename):
+            try:
+                states = cPickle.load(open(pickleFilename, "rb"))
+            except EOFError:
+                states = []
+            print "Converting " + pickleFilename + " to " + storeFilename
+            BoardStateStore.write(storeFilename, self.boardSize, states)
+        return BoardStateStore.BoardStateStore(storeFilename, self.boardSize, self.canonical)
 
     def dupeCheck(self):
         """ To check if there are any duplicates in the states. """
-        print "len: " + str(len(self.states))
-        for i in range(len(self.states)):
-            if self.states[i] in self.states[i+1:len(self.states)]:
-                print "duplicate!"
-            if i % 100 == 0:
-                print "at " + str(i)
+        for side, states in (("white", self.whiteStates), ("black", self.blackStates)):
+            print "len: " + str(len(states))
+            print str(states.countDuplicates()) + " duplicate " + side + " states"
         print "Done duplicate checking"
 
     def cleanUp(self):
         """
         Cleans up the states to remove anything where the number of states is 0 or 1, since we
-        gain no information from those states.
+        gain no information from those states. States where the moves are of the form [A, B, A, B],
+        which only happens on the opening moves, are removed as well. Uses the stores' metadata,
+        so nothing is searched and each side is filtered in one pass.
         :return: None
         """
-        #TODO: If the move is of the form [A, B, A, B] Then it is invalid and should be removed.
-        game = konane.Konane(self.boardSize)
         print(len(self.blackStates))
-        shouldRemove = False
-        for blackState in self.blackStates:
-            moves = game.generateMoves(blackState, "B")
-            if len(moves) <= 1:
-                #print("Removing black move " + str(blackState))
-                #print(str(game.generateMoves(self.blackStates[i], "B")))
-                shouldRemove = True
-            for move in moves:
-                if move[0] == move[2] and move[1] == move[3]:
-                    #Remove moves of the form [A, B, A, B] because that's impossible
-                    shouldRemove = True
-            if shouldRemove:
-                self.blackStates.remove(blackState)
-                shouldRemove = False
+        blackSelection = self.blackStates.select(isInformativeBlack)
+        self.blackStates = [self.blackStates.getBits(index) for index in blackSelection]
         print(len(self.blackStates))
 
         print(len(self.whiteStates))
-        for whiteState in self.whiteStates:
-            moves = game.generateMoves(whiteState, "W")
-            if len(moves) <= 1:
-                #print("Removing white move " + str(whiteState))
-                shouldRemove = True
-            for move in moves:
-                if move[0] == move[2] and move[1] == move[3]:
-                    #Remove moves of the form [A, B, A, B] because that's impossible
-                    shouldRemove = True
-            if shouldRemove:
-                self.whiteStates.remove(whiteState)
-                shouldRemove = False
+        whiteSelection = self.whiteStates.select(isInformativeWhite)
+        self.whiteStates = [self.whiteStates.getBits(index) for index in whiteSelection]
         print(len(self.whiteStates))
 
-        self.updatePickleFiles()
+        self.updateStateFiles()
 
-    def getRandom(self, side):
-        """ Gets a random legal board state from the given side. 
-        :rtype : boardState
-        """
+    def getStates(self, side):
         if side.lower() == "w":
-            return random.choice(self.whiteStates)
+            return self.whiteStates
         elif side.lower() == "b":
-            return random.choice(self.blackStates)
+            return self.blackStates
         else:
             raise ValueError("Side must be W or B")
 
+    def getMoveFilter(self, side, minMoves):
+        """
+        :return: The metadata predicate for side having at least minMoves moves, the same function every time
+            so the stores only select the matching states once.
+        """
+        key = (side.upper(), minMoves)
+        if key not in self.moveFilters:
+            field = BoardStateStore.WHITE_MOVES if side.upper() == "W" else BoardStateStore.BLACK_MOVES
+            self.moveFilters[key] = lambda metadata: metadata[field] >= minMoves
+        return self.moveFilters[key]
+
+    def getRandom(self, side, rand = random, minMoves = None):
+        """ Gets a random legal board state from the given side. 
+        :param rand: Random number generator to draw with, the random module by default
+        :param minMoves: If given, only states where side has at least this many moves are drawn
+        :rtype : boardState
+        """
+        states = self.getStates(side)
+        if minMoves is None:
+            return rand.choice(states)
+        selection = states.select(self.getMoveFilter(side, minMoves))
+        if len(selection) == 0:
+            raise ValueError("No " + side + " states with at least " + str(minMoves) + " moves")
+        return states[rand.choice(selection)]
+
     def getRandomNoSide(self):
         """ Gets a random legal board state from a random side.
          Returns (state, side)
@@ -109,11 +170,13 @@ class RandomStateGenerator:
             moveLens.append(len(moves))
             print "Average: " + str((float(sum(moveLens)) / len(moveLens)))
 
-    def genRandom(self, N = None):
+    def genRandom(self, N = None, checkpointEvery = 10000):
         """ 
         Generates either N random board states and saves them to the file,
         or if N is not provided, continues generating until a keyboard interrupt
         occurs.
+        :param checkpointEvery: The new states are written to the files every this many states,
+            so a crash only loses the states since the last checkpoint.
         """
         #N = None means generate until a keyboard interrupt is caught
         print "Now generating states"
@@ -167,20 +230,78 @@ class RandomStateGenerator:
                 count += 1
                 if count % 1000 == 0:
                     print "Just generated state " + str(count)
+                if count % checkpointEvery == 0:
+                    self.updateStateFiles()
         except KeyboardInterrupt:
             pass #We always want to close out, if we hit this or if we complete the loop
-        self.updatePickleFiles()
+        self.updateStateFiles()
+        print "Out of " + str(count) + " states generated, " + str(numGenerated) + " were unique"
+        print "Done generating"
+        print "Now at " + str(len(self.whiteStates)) + " white board states and " + str(len(self.blackStates)) + " black states."
+
+    def genRandomParallel(self, N = None, processes = None, pliesPerTask = 5000, checkpointEvery = 50000, seed = None):
+        """
+        Generates states like genRandom, but plays the random games in worker processes and merges
+        their states into the stores, skipping any already there. New states are written to the
+        files every checkpointEvery states, and generation adds to whatever corpus is already saved,
+        so an interrupted run can just be started again.
+        :param N: Number of plies to play, or None to play until a keyboard interrupt
+        :param processes: Number of worker processes, defaults to the number of cores.
+        :param pliesPerTask: Plies each worker plays before sending its states back
+        :param seed: Seed for the workers' games, the same seed plays the same games.
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        rand = random.Random(seed)
+        print "Now generating states on " + str(processes) + " processes"
+        numGenerated = 0
+        count = 0
+        lastCheckpoint = 0
+        pool = multiprocessing.Pool(processes)
+        try:
+            while N is None or count < N:
+                # Hand out a few rounds of tasks at a time, so an endless run doesn't queue endless tasks
+                tasks = []
+                while len(tasks) < 4 * processes and (N is None or count + len(tasks) * pliesPerTask < N):
+                    numPlies = pliesPerTask if N is None else min(pliesPerTask, N - count - len(tasks) * pliesPerTask)
+                    tasks.append((self.boardSize, numPlies, rand.getrandbits(32)))
+                for task, (whiteRecords, blackRecords) in zip(tasks, pool.imap(playRandomGames, tasks)):
+                    for records, states in ((whiteRecords, self.whiteStates), (blackRecords, self.blackStates)):
+                        for record in records:
+                            if not states.containsRecord(record):
+                                numGenerated += 1
+                                states.appendRecord(record)
+                    count += task[1]
+                    print "Just generated state " + str(count)
+                    if numGenerated - lastCheckpoint >= checkpointEvery:
+                        self.updateStateFiles()
+                        lastCheckpoint = numGenerated
+        except KeyboardInterrupt:
+            pool.terminate() #We always want to save what was merged, if we hit this or if we complete the loop
+        else:
+            pool.close()
+        pool.join()
+        self.updateStateFiles()
         print "Out of " + str(count) + " states generated, " + str(numGenerated) + " were unique"
         print "Done generating"
         print "Now at " + str(len(self.whiteStates)) + " white board states and " + str(len(self.blackStates)) + " black states."
 
-    def updatePickleFiles(self):
+    def updateStateFiles(self):
         """
-        Updates the pickle files to contain the current whiteStates and blackStates.
+        Updates the state files to contain the current whiteStates and blackStates.
+        States appended to the stores are written to the end of the files, lists of states replace them.
         :return:
         """
-        cPickle.dump(self.whiteStates, open(self.whiteStatesFilename, "wb+"))
-        cPickle.dump(self.blackStates, open(self.blackStatesFilename, "wb+"))
+        if isinstance(self.whiteStates, BoardStateStore.BoardStateStore):
+            self.whiteStates.flush()
+        else:
+            BoardStateStore.write(self.whiteStatesFilename, self.boardSize, self.whiteStates)
+            self.whiteStates = BoardStateStore.BoardStateStore(self.whiteStatesFilename, self.boardSize, self.canonical)
+        if isinstance(self.blackStates, BoardStateStore.BoardStateStore):
+            self.blackStates.flush()
+        else:
+            BoardStateStore.write(self.blackStatesFilename, self.boardSize, self.blackStates)
+            self.blackStates = BoardStateStore.BoardStateStore(self.blackStatesFilename, self.boardSize, self.canonical)
 
 if __name__ == "__main__":
     generator = RandomStateGenerator(boardSize=8)
@@ -43,6 +43,9 @@ class Konane:
     turn.  Play continues until one player has no possible moves,
     making the other player the winner.
     """
+    # Whether boards can be changed in place with applyMove/undoMove
+    inPlaceMoves = True
+
     def __init__(self, n):
         self.size = n
         self.reset()
@@ -169,6 +172,58 @@ class Konane:
             next[r1][c1] = player
         return next
 
+    def applyMove(self, board, player, move):
+        """
+        Executes the move directly on the given board instead of on a copy.
+        Raises a KonaneError, leaving the board untouched, if the move is invalid.
+        Returns the list of (row, col) squares whose opponent pieces were jumped,
+        which undoMove needs to put the board back the way it was.
+        """
+        r1 = move[0]
+        c1 = move[1]
+        r2 = move[2]
+        c2 = move[3]
+        if not (self.valid(r1, c1) and self.valid(r2, c2)):
+            raise KonaneError
+        if board[r1][c1] != player:
+            raise KonaneError
+        dist = self.distance(r1, c1, r2, c2)
+        if dist == 0:
+            if self.openingMove(board):
+                board[r1][c1] = "."
+                return []
+            raise KonaneError
+        if board[r2][c2] != ".":
+            raise KonaneError
+        jumps = dist/2
+        dr = (r2 - r1)/dist
+        dc = (c2 - c1)/dist
+        opponent = self.opponent(player)
+        jumped = []
+        for i in xrange(jumps):
+            if board[r1+dr+2*i*dr][c1+dc+2*i*dc] != opponent:
+                raise KonaneError
+            jumped.append((r1+dr+2*i*dr, c1+dc+2*i*dc))
+        # Only the start, the jumped squares and the end change, every square landed on
+        # in between is left again by the next jump in the same direction.
+        board[r1][c1] = "."
+        for r, c in jumped:
+            board[r][c] = "."
+        board[r2][c2] = player
+        return jumped
+
+    def undoMove(self, board, player, move, jumped):
+        """
+        Reverses applyMove on the given board, using the jumped squares it returned.
+        """
+        board[move[0]][move[1]] = player
+        if move[0] == move[2] and move[1] == move[3]:
+            return
+        board[move[2]][move[3]] = "."
+        opponent = self.opponent(player)
+        for r, c in jumped:
+            board[r][c] = opponent
+
     def openingMove(self, board):
         return self.countSymbol(board, ".") <= 1
 
@@ -293,6 +348,52 @@ class Konane:
             return count
 
 
+    def countFeatures(self, board, player):
+        """
+        Counts the moves, pieces and movable pieces of both sides in a single pass over the board,
+        the same numbers generateMoves, countSymbol and countMovablePieces give. The player to move
+        has lost (the position is terminal) exactly when its number of moves is 0.
+        :return: (player's moves, opponent's moves, player's pieces, opponent's pieces,
+            player's movable pieces, opponent's movable pieces)
+        """
+        opponent = self.opponent(player)
+        n = self.size
+        # [moves, pieces, movable pieces] of each side
+        counts = {'B': [0, 0, 0], 'W': [0, 0, 0]}
+        empties = 0
+        for r, row in enumerate(board):
+            for c, val in enumerate(row):
+                if val == '.':
+                    empties += 1
+                    continue
+                other = 'W' if val == 'B' else 'B'
+                moves = 0
+                for rd, cd in ((0, -1), (-1, 0), (0, 1), (1, 0)):
+                    nextR = r + rd
+                    nextC = c + cd
+                    while 0 <= nextR < n and 0 <= nextC < n and board[nextR][nextC] == other:
+                        targetR = nextR + rd
+                        targetC = nextC + cd
+                        if 0 <= targetR < n and 0 <= targetC < n and board[targetR][targetC] == '.':
+                            moves += 1
+                            nextR = targetR + rd
+                            nextC = targetC + cd
+                        else:
+                            break
+                sideCounts = counts[val]
+                sideCounts[0] += moves
+                sideCounts[1] += 1
+                if moves:
+                    sideCounts[2] += 1
+        if empties <= 1:
+            # The special opening moves don't depend on where the pieces can jump
+            myMoves = len(self.generateMoves(board, player))
+            theirMoves = len(self.generateMoves(board, opponent))
+            return (myMoves, theirMoves, counts[player][1], counts[opponent][1], myMoves, theirMoves)
+        mine = counts[player]
+        theirs = counts[opponent]
+        return (mine[0], theirs[0], mine[1], theirs[1], mine[2], theirs[2])
+
     def playOneGame(self, p1, p2, show):
         """
         Given two instances of players, will play out a game